@@ -1,3 +1,16 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import ProcessedPost, SlotReservation
+
+
+@admin.register(ProcessedPost)
+class ProcessedPostAdmin(admin.ModelAdmin):
+    list_display = ('post_id', 'page_name', 'processed_at')
+    list_filter = ('page_name',)
+    search_fields = ('post_id',)
+
+
+@admin.register(SlotReservation)
+class SlotReservationAdmin(admin.ModelAdmin):
+    list_display = ('account_id', 'slot', 'source', 'created_at')
+    list_filter = ('account_id', 'source')
@@ -0,0 +1,289 @@
+"""
+TTL cache for Apify scrape results, keyed by competitor username and results limit.
+Each entry remembers the newer-than filter it was scraped with, so incremental
+scrapes with any later filter can be served from it.
+"""
+
+import contextlib
+import json
+import sqlite3
+import time
+from datetime import timezone
+from dateutil import parser as date_parser
+from .config import (
+    SCRAPE_CACHE_BACKEND, SCRAPE_CACHE_TTL, SCRAPE_CACHE_MAX_ENTRIES,
+    SCRAPE_CACHE_PATH, SCRAPE_CACHE_DJANGO_ALIAS
+)
+
+
+class ScrapeCache:
+    """Base class for scrape result caches with hit/miss counters"""
+
+    def __init__(self, ttl=SCRAPE_CACHE_TTL, max_entries=SCRAPE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize_username(username):
+        """Instagram usernames are case-insensitive"""
+        return (username or "").lower()
+
+    @classmethod
+    def make_key(cls, username, results_limit):
+        """Cache key for one competitor scrape"""
+        return f"{cls.normalize_username(username)}:{results_limit}"
+
+    @staticmethod
+    def _posts_newer_than(posts, newer_than):
+        """Posts published after newer_than (posts without a readable timestamp are kept)"""
+        newer = []
+        for post in posts:
+            try:
+                timestamp = date_parser.isoparse(post.get('timestamp'))
+            except (ValueError, TypeError):
+                newer.append(post)
+                continue
+            if timestamp.tzinfo is None:
+                timestamp = timestamp.replace(tzinfo=timezone.utc)
+            if timestamp > newer_than:
+                newer.append(post)
+        return newer
+
+    @staticmethod
+    def _covers(entry_newer_than, newer_than):
+        """Whether an entry scraped with entry_newer_than holds every post newer_than asks for"""
+        if entry_newer_than is None:
+            return True
+        return newer_than is not None and date_parser.isoparse(entry_newer_than) <= newer_than
+
+    def get(self, username, results_limit, newer_than=None):
+        """
+        Return cached posts for a competitor, or None on a miss.
+        An entry only covers a request if it was scraped with no filter or an
+        older one; its posts are then narrowed to the requested filter.
+        """
+        try:
+            entry = self._get(self.make_key(username, results_limit))
+            posts = None
+            if isinstance(entry, dict) and self._covers(entry.get("newer_than"), newer_than):
+                posts = entry["posts"]
+                if newer_than is not None:
+                    posts = self._posts_newer_than(posts, newer_than)
+        except Exception as e:
+            print(f"⚠️  Warning: Could not read scrape cache: {e}")
+            posts = None
+
+        if posts is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return posts
+
+    def set(self, username, results_limit, posts, newer_than=None):
+        """Store the posts scraped for a competitor, along with the newer-than filter used"""
+        entry = {"newer_than": newer_than.isoformat() if newer_than else None, "posts": posts}
+        try:
+            self._set(self.make_key(username, results_limit), entry)
+        except Exception as e:
+            print(f"⚠️  Warning: Could not write scrape cache: {e}")
+
+    def delete(self, username, results_limit):
+        """Drop a competitor's entry"""
+        try:
+            self._delete(self.make_key(username, results_limit))
+        except Exception as e:
+            print(f"⚠️  Warning: Could not write scrape cache: {e}")
+
+    def lookup(self, usernames, results_limit, newer_than=None):
+        """
+        Split usernames into cached post lists and usernames that still need scraping
+        Returns: (list of cached post lists, list of usernames to scrape)
+        """
+        cached_posts = []
+        usernames_to_scrape = []
+        for username in usernames:
+            posts = self.get(username, results_limit, newer_than)
+            if posts is None:
+                usernames_to_scrape.append(username)
+            else:
+                cached_posts.append(posts)
+
+        print(f"💾 Scrape cache: {len(cached_posts)} cached, {len(usernames_to_scrape)} to scrape")
+        return cached_posts, usernames_to_scrape
+
+    def writer(self, usernames, results_limit, newer_than=None):
+        """ScrapeCacheWriter caching an actor run's posts as the run streams by"""
+        return ScrapeCacheWriter(self, usernames, results_limit, newer_than)
+
+    def stats(self):
+        """Return hit/miss counters for this process"""
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend_name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _set(self, key, entry):
+        raise NotImplementedError
+
+    def _delete(self, key):
+        raise NotImplementedError
+
+
+class ScrapeCacheWriter:
+    """
+    Caches the posts of one actor run per competitor while the run streams by.
+    Apify returns each username's posts together, so a username's entry is written
+    as soon as the next username starts, and only one username's posts (at most
+    results_limit) are buffered at a time. A username that shows up again after its
+    entry was written is dropped from the cache instead of being cached partially.
+    Posts from usernames that were not requested are not cached, and once one shows
+    up, requested usernames without posts are not cached as empty feeds either.
+    """
+
+    def __init__(self, cache, usernames, results_limit, newer_than=None):
+        self.cache = cache
+        self.results_limit = results_limit
+        self.newer_than = newer_than
+        self.pending = {cache.normalize_username(username) for username in usernames}
+        self.written = set()
+        self.skipped = set()
+        self.unknown_owners = False
+        self.username = None
+        self.posts = []
+
+    def add(self, post):
+        """Buffer one normalized post of the run"""
+        username = self.cache.normalize_username(post.get("owner_username"))
+        if username != self.username:
+            self._write_current()
+            self.username = username
+            self.posts = []
+            if username in self.written:
+                # Interleaved results: the entry written earlier is incomplete
+                self.cache.delete(username, self.results_limit)
+                self.written.discard(username)
+                self.skipped.add(username)
+            elif username not in self.pending and username not in self.skipped:
+                self.unknown_owners = True
+                self.skipped.add(username)
+
+        if username in self.skipped:
+            return
+        self.posts.append(post)
+        if len(self.posts) > self.results_limit:
+            self.skipped.add(username)  # More posts than asked for; not a clean feed
+            self.posts = []
+
+    def _write_current(self):
+        username = self.username
+        if username is None or username in self.skipped:
+            return
+        self.cache.set(username, self.results_limit, self.posts, self.newer_than)
+        self.pending.discard(username)
+        self.written.add(username)
+
+    def finish(self):
+        """Write the last username's entry once the run completed, and empty feeds"""
+        self._write_current()
+        self.username = None
+        self.posts = []
+        if not self.unknown_owners:
+            for username in self.pending - self.skipped:
+                self.cache.set(username, self.results_limit, [], self.newer_than)
+        self.pending = set()
+
+
+class SQLiteScrapeCache(ScrapeCache):
+    """Scrape cache stored in a local SQLite file with LRU eviction"""
+
+    backend_name = "sqlite"
+
+    def __init__(self, path=SCRAPE_CACHE_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS scrape_cache ("
+                " key TEXT PRIMARY KEY,"
+                " payload TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS scrape_cache_last_access ON scrape_cache (last_access)")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """Connection that commits (or rolls back) on exit and is always closed"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT payload FROM scrape_cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE scrape_cache SET last_access = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def _delete(self, key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM scrape_cache WHERE key = ?", (key,))
+
+    def _set(self, key, entry):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO scrape_cache (key, payload, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(entry), now + self.ttl, now)
+            )
+            # Drop expired entries, then the least recently used ones above the size bound
+            conn.execute("DELETE FROM scrape_cache WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "DELETE FROM scrape_cache WHERE key IN ("
+                " SELECT key FROM scrape_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+
+class DjangoScrapeCache(ScrapeCache):
+    """Scrape cache stored in a Django cache backend (size bounded by its MAX_ENTRIES)"""
+
+    backend_name = "django"
+
+    def __init__(self, alias=SCRAPE_CACHE_DJANGO_ALIAS, **kwargs):
+        super().__init__(**kwargs)
+        from django.core.cache import caches
+        self.cache = caches[alias]
+
+    def _get(self, key):
+        return self.cache.get(f"beampage:scrape:{key}")
+
+    def _set(self, key, entry):
+        self.cache.set(f"beampage:scrape:{key}", entry, timeout=self.ttl)
+
+    def _delete(self, key):
+        self.cache.delete(f"beampage:scrape:{key}")
+
+
+def get_scrape_cache(backend=SCRAPE_CACHE_BACKEND):
+    """Build the configured scrape cache, or None when caching is disabled"""
+    if backend == "sqlite":
+        return SQLiteScrapeCache()
+    if backend == "django":
+        return DjangoScrapeCache()
+    return None
@@ -0,0 +1,49 @@
+"""
+Clocks the scheduler and workflow read the current time from, so that months of
+scheduling can be simulated without waiting for them
+"""
+
+import time
+from datetime import datetime, timedelta
+import pytz
+
+
+class SystemClock:
+    """The real wall clock"""
+
+    def time(self):
+        """Current UTC timestamp"""
+        return time.time()
+
+    def now(self, tz=None):
+        """Current datetime in tz (naive local time when tz is None, like datetime.now)"""
+        return datetime.now(tz)
+
+
+class VirtualClock:
+    """
+    A clock that only moves when it is advanced. Starts at `start` (a datetime,
+    naive values taken as UTC, or a timestamp), or at the current time.
+    """
+
+    def __init__(self, start=None):
+        if start is None:
+            start = time.time()
+        elif isinstance(start, datetime):
+            start = (pytz.utc.localize(start) if start.tzinfo is None else start).timestamp()
+        self.timestamp = float(start)
+
+    def time(self):
+        return self.timestamp
+
+    def now(self, tz=None):
+        return datetime.fromtimestamp(self.timestamp, tz)
+
+    def advance(self, seconds=0, **delta):
+        """Move forward by seconds and/or timedelta keyword arguments (hours=1, days=2, ...)"""
+        self.timestamp += seconds + timedelta(**delta).total_seconds()
+        return self.timestamp
+
+    def sleep(self, seconds):
+        """Stand-in for time.sleep that returns at once"""
+        self.advance(seconds)
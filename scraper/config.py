@@ -30,6 +30,12 @@ PAGES = {
         
         # NEW: Total output control
         "max_total_posts_to_schedule": 5,  # Stop when we have this many posts to schedule
+        "batch_scrape": True,  # Scrape all competitors in a single Apify actor run
+        "incremental_scrape": True,  # Only fetch posts newer than each competitor's watermark
+        "dedup_retention_days": 180,  # How long processed posts are remembered for duplicate detection
+        "posting_hours": [15, 19, 23],  # Local times of day to post at (ints or "HH:MM")
+        "timezone": "America/Panama",  # Timezone the posting hours are in
+        "min_spacing_minutes": 120,  # Minimum time between two posts on the account
         
         "socialbu_account_id": 131236
     },
@@ -50,12 +56,18 @@ PAGES = {
         
         # NEW: Total output control
         "max_total_posts_to_schedule": 5,  # Stop when we have this many posts to schedule
+        "batch_scrape": True,  # Scrape all competitors in a single Apify actor run
+        "incremental_scrape": True,  # Only fetch posts newer than each competitor's watermark
+        "dedup_retention_days": 180,  # How long processed posts are remembered for duplicate detection
+        "posting_hours": [15, 19, 23],  # Local times of day to post at (ints or "HH:MM")
+        "timezone": "America/Panama",  # Timezone the posting hours are in
+        "min_spacing_minutes": 120,  # Minimum time between two posts on the account
         
         "socialbu_account_id": 131235
     },
-"gersheps": {
+    "bulldoglovedaily": {
         "ig_account_name": "bulldoglovedaily",
-        "competitors": "bulldogdays","bulldogofi","blessed.english.bulldog","bulldogstuff","englishbulldog.space","englishbulldog_world","bulldog.l_o_v_e"],
+        "competitors": ["bulldogdays","bulldogofi","blessed.english.bulldog","bulldogstuff","englishbulldog.space","englishbulldog_world","bulldog.l_o_v_e"],
         "generic_caption": [
             "Bulldogs are the best ever"
         ],
@@ -64,6 +76,12 @@ PAGES = {
         
         # NEW: Total output control
         "max_total_posts_to_schedule": 5,  # Stop when we have this many posts to schedule
+        "batch_scrape": True,  # Scrape all competitors in a single Apify actor run
+        "incremental_scrape": True,  # Only fetch posts newer than each competitor's watermark
+        "dedup_retention_days": 180,  # How long processed posts are remembered for duplicate detection
+        "posting_hours": [15, 19, 23],  # Local times of day to post at (ints or "HH:MM")
+        "timezone": "America/Panama",  # Timezone the posting hours are in
+        "min_spacing_minutes": 120,  # Minimum time between two posts on the account
         
         "socialbu_account_id": 131234
     },
@@ -76,5 +94,75 @@ APIFY_API_TOKEN = os.getenv("APIFY_API_TOKEN", "")
 # SocialBu API Configuration
 SOCIALBU_API_TOKEN = os.getenv("SOCIALBU_API_TOKEN", "")
 
+# Posting slot template for SocialBu accounts that are not in PAGES
+DEFAULT_POSTING_HOURS = [15, 19, 23]
+DEFAULT_TIMEZONE = "America/Panama"
+DEFAULT_MIN_SPACING_MINUTES = 120
+
+# Timezone SocialBu's publish_at values are written and read in
+SOCIALBU_TIMEZONE = os.getenv("SOCIALBU_TIMEZONE", "America/Panama")
+
+# Pooled HTTP connections per upstream host (SocialBu API, Instagram CDN, S3 signed URLs)
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "10"))  # Keep-alive connections per host
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", "0.5"))  # Seconds, doubled per retry
+
 # Scraper settings
-APIFY_ACTOR_ID = "apify/instagram-post-scraper"  # Try a different actor ID format 
+APIFY_ACTOR_ID = "apify/instagram-post-scraper"  # Try a different actor ID format
+
+# Maximum number of Apify actor runs in flight at once for the concurrent workflow
+APIFY_MAX_CONCURRENT_RUNS = int(os.getenv("APIFY_MAX_CONCURRENT_RUNS", "3"))
+
+# Posts of a page whose media is downloaded, uploaded and processed at once
+MEDIA_MAX_WORKERS = int(os.getenv("MEDIA_MAX_WORKERS", "3"))
+
+# Stream videos from the CDN straight into SocialBu's signed upload (no temp file) when
+# the CDN sends a Content-Length, in chunks of MEDIA_PIPE_CHUNK_SIZE bytes
+MEDIA_PIPE_MODE = os.getenv("MEDIA_PIPE_MODE", "true").lower() == "true"
+MEDIA_PIPE_CHUNK_SIZE = int(os.getenv("MEDIA_PIPE_CHUNK_SIZE", str(1024 * 1024)))
+
+# Downloaded videos are buffered in memory up to this size and spooled to a temporary file
+# beyond it; media memory peaks at about MEDIA_SPOOL_MAX_MEMORY * MEDIA_MAX_WORKERS
+MEDIA_SPOOL_MAX_MEMORY = int(os.getenv("MEDIA_SPOOL_MAX_MEMORY", str(16 * 1024 * 1024)))
+
+# Content-addressed cache of downloaded videos, evicted least recently used first past MEDIA_CACHE_MAX_BYTES.
+# Off by default: when on, piped downloads are also written to disk
+MEDIA_CACHE_ENABLED = os.getenv("MEDIA_CACHE_ENABLED", "false").lower() == "true"
+MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", "media_cache")
+MEDIA_CACHE_MAX_BYTES = int(os.getenv("MEDIA_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))  # 512 MB
+
+# Scrape result cache (backend: "sqlite", "django" or "none")
+SCRAPE_CACHE_BACKEND = os.getenv("SCRAPE_CACHE_BACKEND", "sqlite")
+SCRAPE_CACHE_TTL = int(os.getenv("SCRAPE_CACHE_TTL", "10800"))  # 3 hours
+SCRAPE_CACHE_MAX_ENTRIES = int(os.getenv("SCRAPE_CACHE_MAX_ENTRIES", "1000"))
+SCRAPE_CACHE_PATH = os.getenv("SCRAPE_CACHE_PATH", "scrape_cache.sqlite3")
+SCRAPE_CACHE_DJANGO_ALIAS = os.getenv("SCRAPE_CACHE_DJANGO_ALIAS", "default")
+
+# Processed post store used for duplicate detection ("database", "mmap" or "json")
+PROCESSED_POSTS_BACKEND = os.getenv("PROCESSED_POSTS_BACKEND", "database")
+PROCESSED_POSTS_FILE = os.getenv("PROCESSED_POSTS_FILE", "processed_posts.json")
+PROCESSED_POSTS_INDEX_DIR = os.getenv("PROCESSED_POSTS_INDEX_DIR", "processed_posts_index")
+PROCESSED_POSTS_INDEX_TAIL_SIZE = int(os.getenv("PROCESSED_POSTS_INDEX_TAIL_SIZE", "1024"))
+
+# Processed post history is kept in "day" or "week" buckets per page; buckets older than
+# the page's dedup_retention_days (default below) are dropped whole
+PROCESSED_POSTS_BUCKET = os.getenv("PROCESSED_POSTS_BUCKET", "week")
+PROCESSED_POSTS_RETENTION_DAYS = int(os.getenv("PROCESSED_POSTS_RETENTION_DAYS", "180"))
+
+# Bloom filter answering "definitely new" before the processed post store is queried
+PROCESSED_POSTS_BLOOM_FILTER = os.getenv("PROCESSED_POSTS_BLOOM_FILTER", "true").lower() == "true"
+PROCESSED_POSTS_BLOOM_PATH = os.getenv("PROCESSED_POSTS_BLOOM_PATH", "processed_posts.bloom")
+PROCESSED_POSTS_BLOOM_CAPACITY = int(os.getenv("PROCESSED_POSTS_BLOOM_CAPACITY", "100000"))
+PROCESSED_POSTS_BLOOM_ERROR_RATE = float(os.getenv("PROCESSED_POSTS_BLOOM_ERROR_RATE", "0.01"))
+
+# Slot reservations shared by all processes ("database") or kept per process ("memory"),
+# and how often the database ledger is reconciled with SocialBu's scheduled posts
+SLOT_LEDGER_BACKEND = os.getenv("SLOT_LEDGER_BACKEND", "database")
+SLOT_LEDGER_SYNC_INTERVAL = int(os.getenv("SLOT_LEDGER_SYNC_INTERVAL", "21600"))  # 6 hours
+SOCIALBU_SYNC_MAX_WORKERS = int(os.getenv("SOCIALBU_SYNC_MAX_WORKERS", "4"))  # Pages of scheduled posts fetched at once
+
+# Workflow results log (append-only NDJSON, rotated into gzip segments by size)
+RESULTS_LOG_PATH = os.getenv("RESULTS_LOG_PATH", "workflow_results.ndjson")
+RESULTS_LOG_MAX_BYTES = int(os.getenv("RESULTS_LOG_MAX_BYTES", str(1024 * 1024)))  # 1 MB per segment
+RESULTS_LOG_MAX_SEGMENTS = int(os.getenv("RESULTS_LOG_MAX_SEGMENTS", "10"))
+RESULTS_LOG_COMPRESS = os.getenv("RESULTS_LOG_COMPRESS", "true").lower() == "true"
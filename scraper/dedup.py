@@ -0,0 +1,672 @@
+"""
+Processed post stores used to skip posts that were already selected for reposting
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import time
+from array import array
+from bisect import bisect_left
+from datetime import date, datetime, timedelta
+from django.utils import timezone
+from django.db.models import Count, Max
+from .config import (
+    PROCESSED_POSTS_BACKEND, PROCESSED_POSTS_FILE,
+    PROCESSED_POSTS_INDEX_DIR, PROCESSED_POSTS_INDEX_TAIL_SIZE,
+    PROCESSED_POSTS_BUCKET, PROCESSED_POSTS_RETENTION_DAYS,
+    PROCESSED_POSTS_BLOOM_FILTER, PROCESSED_POSTS_BLOOM_PATH,
+    PROCESSED_POSTS_BLOOM_CAPACITY, PROCESSED_POSTS_BLOOM_ERROR_RATE
+)
+from .models import ProcessedPost
+
+# Maximum number of ids per bulk query/insert
+BULK_BATCH_SIZE = 500
+
+# Instagram shortcodes are media ids written in this base64 alphabet
+SHORTCODE_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+SHORTCODE_VALUES = {char: value for value, char in enumerate(SHORTCODE_ALPHABET)}
+UINT64_MAX = 2 ** 64 - 1
+
+
+def _chunks(items, size=BULK_BATCH_SIZE):
+    """Split a list into consecutive chunks of at most `size` items"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def bucket_start(timestamp, granularity=PROCESSED_POSTS_BUCKET):
+    """First day of the day/week retention bucket containing timestamp"""
+    day = timestamp.date() if isinstance(timestamp, datetime) else timestamp
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def retention_cutoff(retention_days, now=None, granularity=PROCESSED_POSTS_BUCKET):
+    """Oldest bucket still inside a retention window; older buckets are expired"""
+    return bucket_start((now or timezone.now()) - timedelta(days=retention_days), granularity)
+
+
+class JsonProcessedPostStore:
+    """Legacy store: a single JSON file mapping post id -> processed timestamp"""
+
+    backend_name = "json"
+
+    def __init__(self, path=PROCESSED_POSTS_FILE):
+        self.path = path
+
+    def load(self):
+        """Load the whole id -> timestamp mapping"""
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    return json.load(f)
+            return {}
+        except Exception as e:
+            print(f"Warning: Could not load processed posts: {e}")
+            return {}
+
+    def filter_new(self, post_ids):
+        """Return the subset of post_ids that have not been processed yet"""
+        processed_posts = self.load()
+        return {post_id for post_id in post_ids if post_id not in processed_posts}
+
+    def mark_processed(self, post_ids, page_name="", timestamp=None):
+        """Record post_ids as processed"""
+        processed_posts = self.load()
+        timestamp = (timestamp or datetime.now()).isoformat()
+
+        for post_id in post_ids:
+            processed_posts[post_id] = timestamp
+
+        try:
+            with open(self.path, 'w') as f:
+                json.dump(processed_posts, f)
+        except Exception as e:
+            print(f"Warning: Could not save processed posts: {e}")
+
+    def iter_keys(self):
+        """Yield every processed id"""
+        yield from self.load()
+
+    def sync_token(self):
+        """Token that changes whenever the file is rewritten"""
+        if not os.path.exists(self.path):
+            return None
+        stat = os.stat(self.path)
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    def expire(self, retention_days_by_page, default_retention_days=PROCESSED_POSTS_RETENTION_DAYS, now=None):
+        """
+        Drop ids processed before the longest retention window
+        (the legacy file does not record which page processed an id)
+        """
+        longest_retention = max([default_retention_days, *retention_days_by_page.values()])
+        cutoff = retention_cutoff(longest_retention, now)
+        processed_posts = self.load()
+
+        kept = {}
+        for post_id, processed_at in processed_posts.items():
+            try:
+                if bucket_start(datetime.fromisoformat(processed_at)) < cutoff:
+                    continue
+            except (TypeError, ValueError):
+                pass  # Keep entries with unreadable timestamps
+            kept[post_id] = processed_at
+
+        removed = len(processed_posts) - len(kept)
+        if removed:
+            self._write(kept)
+        return removed
+
+    def compact(self):
+        """Rewrite the file without whitespace"""
+        self._write(self.load())
+
+    def _write(self, processed_posts):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(processed_posts, f, separators=(',', ':'))
+        os.replace(temp_path, self.path)
+
+
+class DatabaseProcessedPostStore:
+    """Store backed by the ProcessedPost table (unique index on post_id)"""
+
+    backend_name = "database"
+
+    def filter_new(self, post_ids):
+        """Return the subset of post_ids that have not been processed yet, using bulk lookups"""
+        post_ids = list(dict.fromkeys(post_id for post_id in post_ids if post_id))
+        new_ids = set(post_ids)
+        for chunk in _chunks(post_ids):
+            new_ids.difference_update(
+                ProcessedPost.objects.filter(post_id__in=chunk).values_list('post_id', flat=True)
+            )
+        return new_ids
+
+    def mark_processed(self, post_ids, page_name="", timestamp=None):
+        """Record post_ids as processed with a conflict-ignoring bulk insert"""
+        timestamp = timestamp or timezone.now()
+        bucket = bucket_start(timestamp)
+        records = [
+            ProcessedPost(post_id=post_id, page_name=page_name, processed_at=timestamp, bucket=bucket)
+            for post_id in dict.fromkeys(post_ids) if post_id
+        ]
+        ProcessedPost.objects.bulk_create(records, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+
+    def iter_keys(self):
+        """Yield every processed id without loading the table at once"""
+        yield from ProcessedPost.objects.values_list('post_id', flat=True).iterator(chunk_size=2000)
+
+    def sync_token(self):
+        """Token that changes whenever rows are added or removed"""
+        summary = ProcessedPost.objects.aggregate(count=Count('id'), last_id=Max('id'))
+        return f"{summary['count']}:{summary['last_id']}"
+
+    def expire(self, retention_days_by_page, default_retention_days=PROCESSED_POSTS_RETENTION_DAYS, now=None):
+        """Delete whole buckets that fell out of each page's retention window"""
+        removed = 0
+        for page_name in ProcessedPost.objects.values_list('page_name', flat=True).distinct():
+            cutoff = retention_cutoff(retention_days_by_page.get(page_name, default_retention_days), now)
+            # Range delete on the (page_name, bucket) index
+            removed += ProcessedPost.objects.filter(page_name=page_name, bucket__lt=cutoff).delete()[0]
+        return removed
+
+    def compact(self):
+        """Rows are already indexed; expiry is the only compaction the table needs"""
+
+
+def encode_post_key(post_id):
+    """
+    Map a post id to a uint64: numeric ids as-is, shortcodes decoded from base64,
+    anything else (mock ids) hashed.
+    """
+    post_id = str(post_id)
+    if post_id.isdigit() and int(post_id) <= UINT64_MAX:
+        return int(post_id)
+
+    if post_id and all(char in SHORTCODE_VALUES for char in post_id):
+        value = 0
+        for char in post_id:
+            value = value * 64 + SHORTCODE_VALUES[char]
+        if value <= UINT64_MAX:
+            return value
+
+    return int.from_bytes(hashlib.blake2b(post_id.encode(), digest_size=8).digest(), 'little')
+
+
+def _file_state(file):
+    """(inode, mtime, size) of an open file, to notice when another process changed it"""
+    stat = os.fstat(file.fileno())
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _path_state(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class MmapProcessedPostStore:
+    """
+    Compact store of processed ids as a sorted uint64 array in a memory-mapped file.
+    Lookups binary-search the mapped array; new ids go to a small unsorted tail file
+    that is merge-compacted into the sorted array once it reaches `tail_size` ids.
+    Appends and compactions hold an exclusive lock on <path>.lock and work from the
+    files on disk, so several processes can share one index without losing ids.
+    """
+
+    backend_name = "mmap"
+
+    def __init__(self, path, tail_size=PROCESSED_POSTS_INDEX_TAIL_SIZE):
+        self.path = path
+        self.tail_path = f"{path}.tail"
+        self.tail_size = tail_size
+        self.lock_path = f"{path}.lock"
+        self.tail_size = tail_size
+        self._mmap = None
+        self._index = memoryview(array('Q'))
+        self._index_state = None
+        self._tail_state = None
+        self._open_index()
+        self._tail = self._read_tail()
+
+    def _open_index(self):
+        """Map the sorted array file (opening is O(1); pages load on demand)"""
+        self.close()
+        self._index_state = None
+        try:
+            with open(self.path, 'rb') as f:
+                self._index_state = _file_state(f)
+                if self._index_state[2] > 0:
+                    self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    self._index = memoryview(self._mmap).cast('Q')
+        except FileNotFoundError:
+            pass
+
+    def _read_tail(self):
+        """Load the unsorted tail of recently added ids"""
+        tail = array('Q')
+        self._tail_state = None
+        try:
+            with open(self.tail_path, 'rb') as f:
+                self._tail_state = _file_state(f)
+                data = f.read()
+            # Ignore a torn trailing write
+            tail.frombytes(data[:len(data) - len(data) % tail.itemsize])
+        except FileNotFoundError:
+            pass
+        return set(tail)
+
+    def _refresh(self):
+        """Re-read the index and tail if another process appended to or compacted them"""
+        if _path_state(self.path) != self._index_state:
+            self._open_index()
+        if _path_state(self.tail_path) != self._tail_state:
+            self._tail = self._read_tail()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Hold the exclusive lock that serializes appends and compactions across processes"""
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def close(self):
+        """Release the memory map"""
+        if self._mmap is not None:
+            self._index.release()
+            self._mmap.close()
+            self._mmap = None
+            self._index = memoryview(array('Q'))
+
+    def __len__(self):
+        return len(self._index) + len(self._tail)
+
+    def contains_key(self, key):
+        """Check whether an encoded uint64 key is in the index"""
+        if key in self._tail:
+            return True
+        position = bisect_left(self._index, key)
+        return position < len(self._index) and self._index[position] == key
+
+    def filter_new(self, post_ids):
+        """Return the subset of post_ids that have not been processed yet"""
+        self._refresh()
+        return {post_id for post_id in post_ids if post_id and not self.contains_key(encode_post_key(post_id))}
+
+    def mark_processed(self, post_ids, page_name="", timestamp=None):
+        """Append post_ids to the tail, compacting when the tail grows past tail_size"""
+        with self._locked():
+            self._refresh()
+            keys = array('Q', (
+                key for key in dict.fromkeys(encode_post_key(post_id) for post_id in post_ids if post_id)
+                if not self.contains_key(key)
+            ))
+            if not keys:
+                return
+
+            with open(self.tail_path, 'ab') as f:
+                keys.tofile(f)
+                f.flush()
+                self._tail_state = _file_state(f)
+            self._tail.update(keys)
+
+            if len(self._tail) >= self.tail_size:
+                self._compact()
+
+    def iter_keys(self):
+        """Yield every stored uint64 key"""
+        self._refresh()
+        yield from self._index
+        yield from self._tail
+
+    def sync_token(self):
+        """Token that changes whenever ids are added"""
+        self._refresh()
+        return str(len(self))
+
+    def compact(self):
+        """Merge the tail into the sorted array and atomically replace the index file"""
+        with self._locked():
+            self._refresh()
+            self._compact()
+
+    def _compact(self):
+        """compact() with the lock held and the tail freshly read from disk"""
+        if not self._tail:
+            return
+
+        temp_path = f"{self.path}.tmp"
+        buffer = array('Q')
+        previous = None
+        with open(temp_path, 'wb') as f:
+            for key in heapq.merge(self._index, sorted(self._tail)):
+                if key == previous:
+                    continue
+                buffer.append(key)
+                previous = key
+                if len(buffer) >= 65536:
+                    buffer.tofile(f)
+                    buffer = array('Q')
+            buffer.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.close()
+        os.replace(temp_path, self.path)
+        # Tail ids are now in the sorted array; a crash before this only leaves duplicates
+        with open(self.tail_path, 'wb') as f:
+            self._tail_state = _file_state(f)
+        self._tail = set()
+        self._open_index()
+
+
+class BucketedProcessedPostStore:
+    """
+    Processed ids partitioned into per-page day/week buckets, one memory-mapped
+    index file per bucket (<root>/<page>/<bucket start>.idx). Expiring a bucket
+    just deletes its files, and lookups only scan buckets inside the retention
+    window, so load and lookup cost stay bounded however long the deployment runs.
+    """
+
+    backend_name = "mmap"
+
+    def __init__(self, root=PROCESSED_POSTS_INDEX_DIR, tail_size=PROCESSED_POSTS_INDEX_TAIL_SIZE):
+        self.root = root
+        self.tail_size = tail_size
+        self._buckets = {}  # (page_name, bucket start) -> MmapProcessedPostStore
+        os.makedirs(root, exist_ok=True)
+
+        seen = set()
+        for page_dir in sorted(os.listdir(root)):
+            page_path = os.path.join(root, page_dir)
+            if not os.path.isdir(page_path):
+                continue
+            for file_name in sorted(os.listdir(page_path)):
+                # A bucket may only have a tail file until its first compaction
+                bucket_name = file_name.split('.', 1)[0]
+                if file_name.endswith(('.idx', '.idx.tail')) and (page_dir, bucket_name) not in seen:
+                    seen.add((page_dir, bucket_name))
+                    self._buckets[(page_dir, date.fromisoformat(bucket_name))] = MmapProcessedPostStore(
+                        os.path.join(page_path, f"{bucket_name}.idx"), self.tail_size
+                    )
+
+    def _page_dir(self, page_name):
+        return page_name or "_unassigned"
+
+    def _bucket_store(self, page_name, bucket):
+        key = (self._page_dir(page_name), bucket)
+        if key not in self._buckets:
+            page_path = os.path.join(self.root, key[0])
+            os.makedirs(page_path, exist_ok=True)
+            self._buckets[key] = MmapProcessedPostStore(
+                os.path.join(page_path, f"{bucket.isoformat()}.idx"), self.tail_size
+            )
+        return self._buckets[key]
+
+    def __len__(self):
+        return sum(len(store) for store in self._buckets.values())
+
+    def filter_new(self, post_ids):
+        """Return the subset of post_ids not found in any live bucket"""
+        remaining = {post_id for post_id in post_ids if post_id}
+        for store in self._buckets.values():
+            if not remaining:
+                break
+            remaining = store.filter_new(remaining)
+        return remaining
+
+    def mark_processed(self, post_ids, page_name="", timestamp=None):
+        """Record new post_ids in the page's bucket for timestamp"""
+        new_ids = self.filter_new(post_ids)
+        if new_ids:
+            bucket = bucket_start(timestamp or timezone.now())
+            self._bucket_store(page_name, bucket).mark_processed(new_ids)
+
+    def iter_keys(self):
+        for store in self._buckets.values():
+            yield from store.iter_keys()
+
+    def sync_token(self):
+        """Token that changes whenever ids are added or buckets dropped"""
+        buckets = ",".join(f"{page}/{bucket.isoformat()}" for page, bucket in sorted(self._buckets))
+        return f"{len(self)}:{hashlib.blake2b(buckets.encode(), digest_size=8).hexdigest()}"
+
+    def expire(self, retention_days_by_page, default_retention_days=PROCESSED_POSTS_RETENTION_DAYS, now=None):
+        """Drop expired buckets by deleting their files (O(1) per bucket)"""
+        removed = 0
+        for (page_dir, bucket), store in list(self._buckets.items()):
+            retention_days = retention_days_by_page.get(page_dir, default_retention_days)
+            if bucket >= retention_cutoff(retention_days, now):
+                continue
+            removed += len(store)
+            store.close()
+            for path in (store.path, store.tail_path, store.lock_path):
+                if os.path.exists(path):
+                    os.unlink(path)
+            del self._buckets[(page_dir, bucket)]
+        return removed
+
+    def compact(self):
+        """Merge every bucket's tail into its sorted array"""
+        for store in self._buckets.values():
+            store.compact()
+
+
+def _bloom_key(key):
+    """Bloom filter input for a post id or already encoded uint64 key"""
+    if not isinstance(key, int):
+        key = encode_post_key(key)
+    return key.to_bytes(8, 'little')
+
+
+class BloomFilteredStore:
+    """
+    Persisted Bloom filter in front of an exact processed post store.
+    Keys the filter has never seen are answered as "definitely new" without
+    touching the exact store; only possible hits are checked there. The filter
+    doubles its capacity and rebuilds from the exact store when it fills up or
+    when the exact store changed behind its back (another process wrote to it).
+    `synced_token` is the store's sync token the filter last matched; it is
+    compared before every lookup and write, so ids written by another process
+    are never missing from a filter that gets saved.
+    """
+
+    def __init__(self, store, path=PROCESSED_POSTS_BLOOM_PATH,
+                 capacity=PROCESSED_POSTS_BLOOM_CAPACITY, error_rate=PROCESSED_POSTS_BLOOM_ERROR_RATE):
+        self.store = store
+        self.backend_name = f"{store.backend_name}+bloom"
+        self.path = path
+        self.meta_path = f"{path}.json"
+        self.error_rate = error_rate
+        self.lookups = 0
+        self.exact_lookups = 0
+        self.false_positives = 0
+        self.last_rebuild = {"seconds": None, "keys": None}
+        self.synced_token = None
+
+        if not self._load(capacity):
+            self.rebuild(capacity)
+
+    def _size_for(self, capacity):
+        """Optimal (bits, hashes) for a capacity and target error rate"""
+        bits = max(8, int(math.ceil(-capacity * math.log(self.error_rate) / (math.log(2) ** 2))))
+        hashes = max(1, int(round(bits / capacity * math.log(2))))
+        return bits, hashes
+
+    def _reset(self, capacity):
+        self.capacity = capacity
+        self.bit_count, self.hash_count = self._size_for(capacity)
+        self.bits = bytearray((self.bit_count + 7) // 8)
+        self.count = 0
+
+    def _load(self, capacity):
+        """Load the persisted filter; False if missing, resized or stale"""
+        try:
+            with open(self.meta_path, 'r') as f:
+                meta = json.load(f)
+            if meta["capacity"] < capacity or meta["sync_token"] != self.store.sync_token():
+                return False
+            with open(self.path, 'rb') as f:
+                bits = bytearray(f.read())
+        except (OSError, ValueError, KeyError):
+            return False
+
+        self.capacity = meta["capacity"]
+        self.bit_count, self.hash_count = meta["bit_count"], meta["hash_count"]
+        self.count = meta["count"]
+        self.last_rebuild = meta.get("last_rebuild", self.last_rebuild)
+        if len(bits) != (self.bit_count + 7) // 8:
+            return False
+        self.bits = bits
+        self.synced_token = meta["sync_token"]
+        return True
+
+    def _sync(self):
+        """Rebuild if the exact store changed since the filter last matched it"""
+        if self.store.sync_token() != self.synced_token:
+            self.rebuild()
+
+    def _save(self, sync_token):
+        """Atomically persist the bit array and its metadata, stamped with the store token it matches"""
+        try:
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(self.bits)
+            os.replace(temp_path, self.path)
+
+            meta = {
+                "capacity": self.capacity,
+                "bit_count": self.bit_count,
+                "hash_count": self.hash_count,
+                "count": self.count,
+                "sync_token": sync_token,
+                "last_rebuild": self.last_rebuild,
+            }
+            with open(f"{self.meta_path}.tmp", 'w') as f:
+                json.dump(meta, f)
+            os.replace(f"{self.meta_path}.tmp", self.meta_path)
+            self.synced_token = sync_token
+        except Exception as e:
+            print(f"Warning: Could not save Bloom filter: {e}")
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(_bloom_key(key), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.bit_count for i in range(self.hash_count))
+
+    def _add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def might_contain(self, key):
+        """False means the key was definitely never processed"""
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def rebuild(self, capacity=None):
+        """Rebuild the filter from every key in the exact store"""
+        started = time.time()
+        # Taken before reading, so writes made during the rebuild trigger another one
+        sync_token = self.store.sync_token()
+        self._reset(capacity or self.capacity)
+        for key in self.store.iter_keys():
+            self._add(key)
+
+        if self.count > self.capacity:
+            # Grow so the false positive rate stays at the target
+            return self.rebuild(max(self.count * 2, self.capacity * 2))
+
+        self.last_rebuild = {"seconds": round(time.time() - started, 3), "keys": self.count}
+        print(f"   🌸 Rebuilt Bloom filter from {self.count} keys in {self.last_rebuild['seconds']}s")
+        self._save(sync_token)
+
+    def filter_new(self, post_ids):
+        """Return the subset of post_ids that have not been processed yet"""
+        post_ids = [post_id for post_id in dict.fromkeys(post_ids) if post_id]
+        self.lookups += len(post_ids)
+        self._sync()
+
+        possible_hits = [post_id for post_id in post_ids if self.might_contain(post_id)]
+        new_ids = set(post_ids) - set(possible_hits)
+        if possible_hits:
+            self.exact_lookups += len(possible_hits)
+            confirmed_new = self.store.filter_new(possible_hits)
+            self.false_positives += len(confirmed_new)
+            new_ids |= confirmed_new
+        return new_ids
+
+    def mark_processed(self, post_ids, page_name="", timestamp=None):
+        """Record post_ids in the exact store and the filter"""
+        post_ids = [post_id for post_id in dict.fromkeys(post_ids) if post_id]
+        self._sync()
+        self.store.mark_processed(post_ids, page_name=page_name, timestamp=timestamp)
+        for post_id in post_ids:
+            self._add(post_id)
+
+        if self.count > self.capacity:
+            self.rebuild(self.capacity * 2)
+        else:
+            self._save(self.store.sync_token())
+
+    def iter_keys(self):
+        return self.store.iter_keys()
+
+    def sync_token(self):
+        return self.store.sync_token()
+
+    def expire(self, retention_days_by_page, default_retention_days=PROCESSED_POSTS_RETENTION_DAYS, now=None):
+        """Expire the exact store; Bloom filters cannot delete, so rebuild after removals"""
+        removed = self.store.expire(retention_days_by_page, default_retention_days, now)
+        if removed:
+            self.rebuild()
+        return removed
+
+    def compact(self):
+        self.store.compact()
+
+    def stats(self):
+        """False positive rates and rebuild cost of the filter"""
+        estimated_rate = (1 - math.exp(-self.hash_count * self.count / self.bit_count)) ** self.hash_count
+        negatives = self.lookups - self.exact_lookups + self.false_positives
+        return {
+            "backend": self.backend_name,
+            "keys": self.count,
+            "capacity": self.capacity,
+            "size_bytes": len(self.bits),
+            "hash_count": self.hash_count,
+            "lookups": self.lookups,
+            "exact_store_lookups": self.exact_lookups,
+            "estimated_false_positive_rate": estimated_rate,
+            "observed_false_positive_rate": self.false_positives / negatives if negatives else 0.0,
+            "last_rebuild_seconds": self.last_rebuild["seconds"],
+            "last_rebuild_keys": self.last_rebuild["keys"],
+        }
+
+
+def get_processed_post_store(backend=PROCESSED_POSTS_BACKEND, bloom_filter=PROCESSED_POSTS_BLOOM_FILTER):
+    """Build the configured processed post store, optionally behind a Bloom filter"""
+    if backend == "json":
+        store = JsonProcessedPostStore()
+    elif backend == "mmap":
+        store = BucketedProcessedPostStore()
+    else:
+        store = DatabaseProcessedPostStore()
+
+    if bloom_filter:
+        return BloomFilteredStore(store)
+    return store
@@ -0,0 +1,39 @@
+"""
+Django management command to expire old processed post buckets and compact the processed post store
+"""
+
+from django.core.management.base import BaseCommand
+from scraper.config import PAGES, PROCESSED_POSTS_BACKEND, PROCESSED_POSTS_RETENTION_DAYS
+from scraper.dedup import get_processed_post_store
+
+
+class Command(BaseCommand):
+    help = 'Drop processed posts past their retention window and compact the processed post store'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backend',
+            choices=['database', 'mmap', 'json'],
+            default=None,
+            help='Store to compact (default: PROCESSED_POSTS_BACKEND)',
+        )
+        parser.add_argument(
+            '--retention-days',
+            type=int,
+            default=PROCESSED_POSTS_RETENTION_DAYS,
+            help=f'Retention for pages without dedup_retention_days (default: {PROCESSED_POSTS_RETENTION_DAYS})',
+        )
+
+    def handle(self, *args, **options):
+        store = get_processed_post_store(options['backend'] or PROCESSED_POSTS_BACKEND)
+
+        retention_days_by_page = {
+            page_name: page_config["dedup_retention_days"]
+            for page_name, page_config in PAGES.items() if "dedup_retention_days" in page_config
+        }
+        removed = store.expire(retention_days_by_page, options['retention_days'])
+        store.compact()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Expired {removed} processed posts and compacted the {store.backend_name} store'
+        ))
@@ -0,0 +1,51 @@
+"""
+Django management command to import the legacy processed_posts.json into a processed post store
+"""
+
+import json
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from scraper.config import PROCESSED_POSTS_FILE
+from scraper.dedup import get_processed_post_store
+from scraper.services import parse_post_timestamp
+
+
+class Command(BaseCommand):
+    help = 'Import processed post ids from the legacy processed_posts.json file into a processed post store'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            default=PROCESSED_POSTS_FILE,
+            help=f'Path to the JSON file to import (default: {PROCESSED_POSTS_FILE})',
+        )
+        parser.add_argument(
+            '--backend',
+            choices=['database', 'mmap'],
+            default='database',
+            help='Store to import into (default: database)',
+        )
+
+    def handle(self, *args, **options):
+        path = options['file']
+
+        try:
+            with open(path, 'r') as f:
+                processed_posts = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read {path}: {e}')
+
+        # Group ids by their original timestamp so each bulk insert keeps it
+        ids_by_timestamp = {}
+        for post_id, processed_at in processed_posts.items():
+            ids_by_timestamp.setdefault(processed_at, []).append(post_id)
+
+        store = get_processed_post_store(options['backend'])
+        for processed_at, post_ids in ids_by_timestamp.items():
+            timestamp = parse_post_timestamp(processed_at) or timezone.now()
+            store.mark_processed(post_ids, timestamp=timestamp)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {len(processed_posts)} processed posts from {path} into the {store.backend_name} store '
+            f'(existing ids were skipped)'
+        ))
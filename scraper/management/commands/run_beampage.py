@@ -15,11 +15,25 @@ class Command(BaseCommand):
             nargs='?',
             help='Name of the page to process (optional). Use "list" to see configured pages, "status" for recent results.'
         )
+        parser.add_argument(
+            '--concurrent',
+            action='store_true',
+            help='Scrape all pages concurrently with the async Apify client',
+        )
+        parser.add_argument(
+            '--max-concurrent-runs',
+            type=int,
+            help='Maximum number of Apify actor runs in flight (default: APIFY_MAX_CONCURRENT_RUNS)',
+        )
 
     def handle(self, *args, **options):
         page_name = options.get('page_name')
         
         try:
-            run_workflow_command(page_name)
+            run_workflow_command(
+                page_name,
+                concurrent=options.get('concurrent'),
+                max_concurrent_runs=options.get('max_concurrent_runs')
+            )
         except Exception as e:
             raise CommandError(f'Workflow failed: {e}') 
\ No newline at end of file
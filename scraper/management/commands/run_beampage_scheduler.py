@@ -20,17 +20,29 @@ class Command(BaseCommand):
             default=3600,  # 1 hour
             help='Interval between runs in seconds (default: 3600)',
         )
+        parser.add_argument(
+            '--concurrent',
+            action='store_true',
+            help='Scrape all pages concurrently with the async Apify client',
+        )
+        parser.add_argument(
+            '--max-concurrent-runs',
+            type=int,
+            help='Maximum number of Apify actor runs in flight (default: APIFY_MAX_CONCURRENT_RUNS)',
+        )
 
     def handle(self, *args, **options):
         page_name = options.get('page')
         interval = options.get('interval')
+        concurrent = options.get('concurrent')
+        max_concurrent_runs = options.get('max_concurrent_runs')
         
         logger.info(f"Starting Beampage scheduler (interval: {interval}s)")
         
         while True:
             try:
                 logger.info("Running Beampage workflow...")
-                run_workflow_command(page_name)
+                run_workflow_command(page_name, concurrent=concurrent, max_concurrent_runs=max_concurrent_runs)
                 logger.info(f"Workflow completed. Sleeping for {interval} seconds...")
                 time.sleep(interval)
             except Exception as e:
@@ -0,0 +1,56 @@
+"""
+Django management command to fast-forward the scheduling workflow on a virtual clock
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from scraper.config import PAGES
+from scraper.simulation import ScheduleSimulation
+
+
+class Command(BaseCommand):
+    help = 'Simulate months of hourly workflow runs against fake Apify/SocialBu services and report slot usage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help='Virtual days to simulate (default: 90)')
+        parser.add_argument('--cycle-hours', type=float, default=1, help='Virtual hours between workflow runs (default: 1)')
+        parser.add_argument('--posts-per-day', type=float, default=2, help='Posts each fake competitor publishes per day (default: 2)')
+        parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of SocialBu posts that fail (default: 0)')
+        parser.add_argument('--report-every', type=int, default=7, help='Days per report row (default: 7)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+        parser.add_argument('--page', type=str, help='Simulate a single page')
+        parser.add_argument('--verbose', action='store_true', help='Show the workflow output of every run')
+
+    def handle(self, *args, **options):
+        pages = PAGES
+        if options['page']:
+            if options['page'] not in PAGES:
+                raise CommandError(f"Page '{options['page']}' not found in configuration")
+            pages = {options['page']: PAGES[options['page']]}
+
+        simulation = ScheduleSimulation(
+            days=options['days'],
+            cycle_hours=options['cycle_hours'],
+            posts_per_day=options['posts_per_day'],
+            failure_rate=options['failure_rate'],
+            seed=options['seed'],
+            pages=pages,
+            verbose=options['verbose']
+        )
+        self.stdout.write(f"⏩ Simulating {options['days']} days of workflow runs every {options['cycle_hours']}h...")
+        reports = simulation.run(report_every_days=options['report_every'])
+
+        self.stdout.write(f"{'Day':>5}  {'Page':<20} {'Scheduled':>9} {'Utilization':>11} {'Lag mean/max (h)':>17} "
+                          f"{'Horizon (d)':>11} {'Lookups':>8} {'µs/lookup':>9}")
+        for report in reports:
+            for page_name, page in report['pages'].items():
+                self.stdout.write(
+                    f"{report['day']:>5}  {page_name:<20} {page['scheduled']:>9} {page['utilization']:>11.0%} "
+                    f"{page['mean_lag_hours']:>8.1f}/{page['max_lag_hours']:<8.1f} {page['horizon_days']:>11} "
+                    f"{report['lookups']:>8} {report['lookup_us']:>9.1f}"
+                )
+
+        scheduled = len(simulation.socialbu_service.scheduled)
+        self.stdout.write(self.style.SUCCESS(
+            f"Simulated {options['days']} days in {simulation.elapsed_seconds}s: {scheduled} posts scheduled, "
+            f"{simulation.apify_service.runs} scrapes"
+        ))
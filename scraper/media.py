@@ -0,0 +1,282 @@
+"""
+Buffers and a local cache for downloaded media on its way to SocialBu
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from .config import (
+    MEDIA_SPOOL_MAX_MEMORY, MEDIA_PIPE_CHUNK_SIZE, MEDIA_CACHE_ENABLED, MEDIA_CACHE_DIR, MEDIA_CACHE_MAX_BYTES
+)
+from .transport import StreamedBody
+
+# Temporary files older than this were abandoned by an interrupted write
+STALE_TEMP_SECONDS = 3600
+
+
+class MediaBuffer:
+    """
+    A downloaded video held in a SpooledTemporaryFile: in memory up to max_memory
+    bytes and rolled over to a temporary file beyond that, so only large videos
+    touch the disk. Each buffer holds at most max_memory bytes of RAM.
+    """
+
+    def __init__(self, name="video.mp4", mime_type="video/mp4", max_memory=MEDIA_SPOOL_MAX_MEMORY):
+        self.name = name
+        self.mime_type = mime_type
+        self.size = 0
+        self.file = tempfile.SpooledTemporaryFile(max_size=max_memory, suffix='.mp4')
+
+    def __len__(self):
+        return self.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def on_disk(self):
+        """Whether the buffer outgrew max_memory and was rolled over to disk"""
+        return getattr(self.file, '_rolled', False)
+
+    def write(self, chunk):
+        self.file.write(chunk)
+        self.size += len(chunk)
+
+    def fill(self, chunks):
+        """Write every chunk of an iterable (e.g. response.iter_content()); returns the size"""
+        for chunk in chunks:
+            if chunk:
+                self.write(chunk)
+        return self.size
+
+    def body(self, chunk_size=MEDIA_PIPE_CHUNK_SIZE):
+        """Sized request body reading the buffer from the start"""
+        self.file.seek(0)
+        return StreamedBody(self.file, self.size, chunk_size)
+
+    def close(self):
+        self.file.close()
+
+
+class MediaCacheWriter:
+    """
+    Streams one video into the cache: chunks go to a temporary file in the cache
+    directory while being hashed, and commit() moves it into place atomically.
+    A failed write (e.g. a full disk) only drops the entry, never the upload it tees.
+    """
+
+    def __init__(self, cache, key, mime_type):
+        self.cache = cache
+        self.key = key
+        self.mime_type = mime_type
+        self.size = 0
+        self.failed = False
+        self.digest = hashlib.sha256()
+        handle, self.temp_path = tempfile.mkstemp(dir=cache.objects_dir, suffix='.tmp')
+        self.file = os.fdopen(handle, 'wb')
+
+    def write(self, chunk):
+        if self.failed:
+            return
+        try:
+            self.file.write(chunk)
+        except OSError as e:
+            print(f"⚠️  Warning: Could not write to media cache: {e}")
+            self.failed = True
+            return
+        self.digest.update(chunk)
+        self.size += len(chunk)
+
+    def commit(self):
+        """Store the written bytes under their content hash and point the key at them; returns the hash or None"""
+        if self.failed:
+            self.discard()
+            return None
+        self.file.close()
+        content_hash = self.digest.hexdigest()
+        os.replace(self.temp_path, self.cache._object_path(content_hash))
+        self.cache._write_entry(self.key, {"sha256": content_hash, "size": self.size, "mime_type": self.mime_type})
+        self.cache._record_store(self.size)
+        self.cache.evict()
+        return content_hash
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.temp_path):
+            os.unlink(self.temp_path)
+
+
+class MediaCache:
+    """
+    Content-addressed cache of downloaded videos on local disk.
+    Videos are stored once per SHA-256 of their bytes (objects/<sha256>), and
+    keys (Instagram shortcode or post id, or the CDN file name) point at them
+    (keys/<key digest>.json), so the same video selected again by another page,
+    a rerun or a retry is not downloaded twice. All writes go through a temporary
+    file and os.replace, so readers never see partial files. Once objects and keys
+    together exceed max_bytes, the least recently used objects are evicted with
+    their keys (reads refresh an object's mtime).
+    """
+
+    backend_name = "disk"
+
+    def __init__(self, root=MEDIA_CACHE_DIR, max_bytes=MEDIA_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.objects_dir = os.path.join(root, "objects")
+        self.keys_dir = os.path.join(root, "keys")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.keys_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.bytes_stored = 0
+        self.evict()  # Sweep what an interrupted run left behind
+
+    def _object_path(self, content_hash):
+        return os.path.join(self.objects_dir, content_hash)
+
+    def _entry_path(self, key):
+        return os.path.join(self.keys_dir, hashlib.blake2b(str(key).encode(), digest_size=16).hexdigest() + ".json")
+
+    def _write_entry(self, key, entry):
+        handle, temp_path = tempfile.mkstemp(dir=self.keys_dir, suffix='.tmp')
+        with os.fdopen(handle, 'w') as f:
+            json.dump(entry, f)
+        os.replace(temp_path, self._entry_path(key))
+
+    def get(self, key):
+        """
+        Cached video for key as (open binary file, size, mime_type), or None on a miss
+        """
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path) as f:
+                entry = json.load(f)
+            media_file = open(self._object_path(entry["sha256"]), 'rb')
+        except (OSError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError) or os.path.exists(entry_path):
+                try:
+                    os.unlink(entry_path)  # Evicted video or unreadable entry
+                except OSError:
+                    pass
+            with self.lock:
+                self.misses += 1
+            return None
+
+        try:
+            os.utime(media_file.name)  # Most recently used
+        except OSError:
+            pass
+        with self.lock:
+            self.hits += 1
+            self.bytes_saved += entry["size"]
+        return media_file, entry["size"], entry.get("mime_type", "video/mp4")
+
+    def writer(self, key, mime_type="video/mp4"):
+        """MediaCacheWriter for a video about to be downloaded"""
+        return MediaCacheWriter(self, key, mime_type)
+
+    def store_buffer(self, key, buffer):
+        """Copy a complete MediaBuffer into the cache"""
+        writer = self.writer(key, buffer.mime_type)
+        try:
+            for chunk in buffer.body():
+                writer.write(chunk)
+        except Exception:
+            writer.discard()
+            raise
+        return writer.commit()
+
+    def _record_store(self, size):
+        with self.lock:
+            self.bytes_stored += size
+
+    @staticmethod
+    def _unlink(path, size):
+        """Delete a cache file; returns the bytes freed"""
+        try:
+            os.unlink(path)
+            return size
+        except OSError:
+            return 0
+
+    def evict(self):
+        """
+        Delete least recently used videos, and the keys pointing at them, until the
+        cache fits in max_bytes. Keys whose video is gone and temporary files left by
+        interrupted writes are deleted as well. Returns the bytes freed.
+        """
+        with self.lock:
+            stale_before = time.time() - STALE_TEMP_SECONDS
+            freed = 0
+            objects = {}  # sha256 -> [mtime, bytes of the object and its keys, key paths]
+            for entry in os.scandir(self.objects_dir):
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                if entry.name.endswith('.tmp'):
+                    if stat.st_mtime < stale_before:
+                        freed += self._unlink(entry.path, stat.st_size)
+                else:
+                    objects[entry.name] = [stat.st_mtime, stat.st_size, []]
+
+            for entry in os.scandir(self.keys_dir):
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                if entry.name.endswith('.tmp'):
+                    if stat.st_mtime < stale_before:
+                        freed += self._unlink(entry.path, stat.st_size)
+                    continue
+                try:
+                    with open(entry.path) as f:
+                        content_hash = json.load(f)["sha256"]
+                except (OSError, ValueError, KeyError):
+                    content_hash = None
+                if content_hash in objects:
+                    objects[content_hash][1] += stat.st_size
+                    objects[content_hash][2].append(entry.path)
+                else:
+                    freed += self._unlink(entry.path, stat.st_size)  # Its video was evicted
+
+            total = sum(size for _, size, _ in objects.values())
+            for content_hash, (_, size, key_paths) in sorted(objects.items(), key=lambda item: item[1][0]):
+                if total <= self.max_bytes:
+                    break
+                for path in key_paths:
+                    self._unlink(path, 0)
+                self._unlink(self._object_path(content_hash), 0)
+                total -= size
+                freed += size
+            return freed
+
+    def stats(self):
+        """Return hit/miss counters for this process and the bytes it did not download"""
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend_name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "bytes_stored": self.bytes_stored
+        }
+
+
+def get_media_cache(enabled=MEDIA_CACHE_ENABLED):
+    """Build the configured media cache, or None when caching is disabled"""
+    if not enabled:
+        return None
+    try:
+        return MediaCache()
+    except OSError as e:
+        print(f"⚠️  Warning: Media cache unavailable: {e}")
+        return None
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessedPost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post_id', models.CharField(max_length=64, unique=True)),
+                ('page_name', models.CharField(blank=True, default='', max_length=100)),
+                ('processed_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def fill_buckets(apps, schema_editor):
+    ProcessedPost = apps.get_model('scraper', 'ProcessedPost')
+    for post in ProcessedPost.objects.filter(bucket__isnull=True).iterator(chunk_size=2000):
+        day = post.processed_at.date()
+        # Weekly buckets (the default PROCESSED_POSTS_BUCKET) start on Monday
+        post.bucket = day - timedelta(days=day.weekday())
+        post.save(update_fields=['bucket'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processedpost',
+            name='bucket',
+            field=models.DateField(null=True),
+        ),
+        migrations.RunPython(fill_buckets, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='processedpost',
+            name='bucket',
+            field=models.DateField(),
+        ),
+        migrations.AddIndex(
+            model_name='processedpost',
+            index=models.Index(fields=['page_name', 'bucket'], name='processed_page_bucket_idx'),
+        ),
+    ]
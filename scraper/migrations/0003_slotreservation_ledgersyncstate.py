@@ -0,0 +1,33 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0002_processedpost_bucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account_id', models.CharField(blank=True, default='', max_length=64)),
+                ('slot', models.DateTimeField()),
+                ('source', models.CharField(default='reserved', max_length=16)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['slot'], name='slot_reservation_slot_idx')],
+                'constraints': [models.UniqueConstraint(fields=('account_id', 'slot'), name='unique_account_slot')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+                ('synced_at', models.DateTimeField()),
+            ],
+        ),
+    ]
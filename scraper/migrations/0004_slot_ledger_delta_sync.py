@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0003_slotreservation_ledgersyncstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='slotreservation',
+            name='socialbu_post_id',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='ledgersyncstate',
+            name='validators',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
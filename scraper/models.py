@@ -1,3 +1,53 @@
 from django.db import models
 
-# Create your models here.
+
+class ProcessedPost(models.Model):
+    """A scraped Instagram post that has already been selected for reposting"""
+
+    post_id = models.CharField(max_length=64, unique=True)
+    page_name = models.CharField(max_length=100, blank=True, default="")
+    processed_at = models.DateTimeField(db_index=True)
+    bucket = models.DateField()  # Start of the day/week bucket used for retention
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['page_name', 'bucket'], name='processed_page_bucket_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} ({self.page_name or 'unknown page'})"
+
+
+class SlotReservation(models.Model):
+    """A strategic posting slot taken on a SocialBu account, shared by every worker process"""
+
+    SOURCE_RESERVED = "reserved"  # Reserved by a workflow run
+    SOURCE_SOCIALBU = "socialbu"  # Found among SocialBu's scheduled posts
+
+    account_id = models.CharField(max_length=64, blank=True, default="")  # "" blocks the slot for every account
+    slot = models.DateTimeField()
+    source = models.CharField(max_length=16, default=SOURCE_RESERVED)
+    socialbu_post_id = models.CharField(max_length=64, blank=True, default="", db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account_id', 'slot'], name='unique_account_slot'),
+        ]
+        indexes = [
+            models.Index(fields=['slot'], name='slot_reservation_slot_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.account_id or 'all accounts'} @ {self.slot.isoformat()}"
+
+
+class LedgerSyncState(models.Model):
+    """When the slot ledger was last reconciled with SocialBu's scheduled posts"""
+
+    name = models.CharField(max_length=64, unique=True)
+    synced_at = models.DateTimeField()
+    validators = models.JSONField(default=dict, blank=True)  # Per-page ETag/Last-Modified and post ids
+
+    def __str__(self):
+        return f"{self.name} synced at {self.synced_at.isoformat()}"
@@ -0,0 +1,121 @@
+"""
+Append-only NDJSON log of workflow results with size-based rotation
+"""
+
+import glob
+import gzip
+import json
+import os
+import shutil
+from .config import RESULTS_LOG_PATH, RESULTS_LOG_MAX_BYTES, RESULTS_LOG_MAX_SEGMENTS, RESULTS_LOG_COMPRESS
+
+# Bytes read per backwards seek when tailing the active log file
+TAIL_BLOCK_SIZE = 8192
+
+
+class ResultsLog:
+    """
+    Workflow results appended one JSON record per line to an active file.
+    Once the active file grows past max_bytes it is rotated into a numbered
+    segment (gzip-compressed by default) and only the newest max_segments
+    segments are kept. Appends never rewrite existing records, and tail reads
+    seek backwards from the end so only the last N records are parsed.
+    """
+
+    def __init__(self, path=RESULTS_LOG_PATH, max_bytes=RESULTS_LOG_MAX_BYTES,
+                 max_segments=RESULTS_LOG_MAX_SEGMENTS, compress=RESULTS_LOG_COMPRESS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_segments = max_segments
+        self.compress = compress
+
+    def append(self, records):
+        """Append records to the active file, rotating it once it is too large"""
+        lines = "".join(json.dumps(record, separators=(',', ':'), default=str) + "\n" for record in records)
+        if not lines:
+            return
+
+        with open(self.path, 'a') as f:
+            f.write(lines)
+            size = f.tell()
+
+        if size >= self.max_bytes:
+            self.rotate()
+
+    def _segments(self):
+        """Rotated segment paths, oldest first"""
+        return sorted(
+            segment_path for segment_path in glob.glob(f"{glob.escape(self.path)}.[0-9]*")
+            if not segment_path.endswith('.tmp')
+        )
+
+    @staticmethod
+    def _segment_number(segment_path):
+        name = segment_path[:-len('.gz')] if segment_path.endswith('.gz') else segment_path
+        return int(name.rsplit('.', 1)[1])
+
+    def rotate(self):
+        """Move the active file into the next numbered segment and drop the oldest ones"""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+
+        segments = self._segments()
+        sequence = self._segment_number(segments[-1]) + 1 if segments else 1
+        segment_path = f"{self.path}.{sequence:06d}"
+
+        if self.compress:
+            with open(self.path, 'rb') as source, gzip.open(f"{segment_path}.gz.tmp", 'wb') as target:
+                shutil.copyfileobj(source, target)
+            os.replace(f"{segment_path}.gz.tmp", f"{segment_path}.gz")
+            os.unlink(self.path)
+        else:
+            os.replace(self.path, segment_path)
+
+        for old_segment in self._segments()[:-self.max_segments or None]:
+            os.unlink(old_segment)
+
+    def tail(self, limit=10):
+        """Return the last `limit` records, oldest first"""
+        records = []
+        for lines in self._iter_lines_reversed():
+            for line in lines:
+                if len(records) >= limit:
+                    break
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue  # Skip a torn trailing write
+            if len(records) >= limit:
+                break
+        records.reverse()
+        return records
+
+    def _iter_lines_reversed(self):
+        """Yield batches of lines from newest to oldest across the active file and segments"""
+        if os.path.exists(self.path):
+            yield from self._read_lines_backwards(self.path)
+
+        for segment_path in reversed(self._segments()):
+            if segment_path.endswith('.gz'):
+                # gzip cannot seek backwards, but segments are bounded by max_bytes
+                with gzip.open(segment_path, 'rb') as f:
+                    yield [line for line in reversed(f.read().split(b"\n")) if line.strip()]
+            else:
+                yield from self._read_lines_backwards(segment_path)
+
+    def _read_lines_backwards(self, path):
+        """Yield complete lines of a plain file, newest first, reading fixed blocks from the end"""
+        with open(path, 'rb') as f:
+            position = f.seek(0, os.SEEK_END)
+            remainder = b""
+            while position > 0:
+                read_size = min(TAIL_BLOCK_SIZE, position)
+                position -= read_size
+                f.seek(position)
+                chunk = f.read(read_size) + remainder
+                lines = chunk.split(b"\n")
+                # The first piece may be a partial line continued in the previous block
+                remainder = lines.pop(0)
+                yield [line for line in reversed(lines) if line.strip()]
+            if remainder.strip():
+                yield [remainder]
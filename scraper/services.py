@@ -3,116 +3,383 @@ Service classes for handling external API interactions
 """
 
 import requests
+import heapq
 import json
 import time
-import tempfile
+import threading
 import os
-import mimetypes
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import pytz
+from dateutil import parser as date_parser
 from urllib.parse import urlparse
-from pathlib import Path
 from apify_client import ApifyClient, ApifyClientAsync
-from .config import APIFY_API_TOKEN, SOCIALBU_API_TOKEN, APIFY_ACTOR_ID
+from .config import (
+    PAGES, APIFY_API_TOKEN, SOCIALBU_API_TOKEN, APIFY_ACTOR_ID,
+    SLOT_LEDGER_SYNC_INTERVAL, SOCIALBU_SYNC_MAX_WORKERS, SOCIALBU_TIMEZONE,
+    DEFAULT_POSTING_HOURS, DEFAULT_TIMEZONE, DEFAULT_MIN_SPACING_MINUTES,
+    MEDIA_PIPE_MODE, MEDIA_PIPE_CHUNK_SIZE
+)
+from .clock import SystemClock
+from .media import MediaBuffer, get_media_cache
+from .transport import HttpTransport, StreamedBody
+from .slots import ReservationIndex, SlotCalendar, SlotTemplate, get_slot_ledger
+
+# Timezone of SocialBu's publish_at values
+SOCIALBU_TZ = pytz.timezone(SOCIALBU_TIMEZONE)
+
+
+def parse_post_timestamp(value):
+    """Parse an Apify/ISO post timestamp into an aware UTC datetime (None if missing or invalid)"""
+    if not value:
+        return None
+    try:
+        timestamp = date_parser.isoparse(value)
+    except (ValueError, TypeError):
+        return None
+    if timestamp.tzinfo is None:
+        timestamp = pytz.utc.localize(timestamp)
+    return timestamp.astimezone(pytz.utc)
 
-# Panama timezone
-PANAMA_TZ = pytz.timezone('America/Panama')
 
 class StrategicScheduler:
-    """Manages strategic posting time slots (10am, 2pm, 6pm) across days"""
+    """
+    Manages strategic posting time slots across days.
+    Each SocialBu account has its own slot ledger on its page's slot template
+    (posting_hours, timezone and min_spacing_minutes in PAGES), so pages never
+    compete for slots and each can post at its own times and frequency.
+    With a ledger_store (DatabaseSlotLedger) every reservation is also claimed in the
+    shared SlotReservation table, so concurrent processes cannot double-book a slot.
+    Every reservation, at any minute, is also kept in the account's ReservationIndex,
+    and template slots closer than min_spacing_minutes to one are blocked in the calendar.
+    All ledger state is guarded by one re-entrant lock, so a scheduler can be shared by
+    worker threads; the lock is never held across network or database calls in
+    reserve_slots/release_slots, so holding it briefly on an event loop is fine too.
+    The current time comes from `clock` (SystemClock by default, VirtualClock in simulations).
+    """
     
-    def __init__(self):
-        # Strategic posting times (hours in 24-hour format)
-        self.strategic_times = [15, 19, 23]  # 10am, 2pm, 6pm
-        self.scheduled_slots = set()  # Track used slots as (date, hour) tuples
+    def __init__(self, ledger_store=None, pages=None, clock=None):
+        pages = PAGES if pages is None else pages
+        self.clock = clock or SystemClock()
+        self.default_template = SlotTemplate(DEFAULT_POSTING_HOURS, DEFAULT_TIMEZONE, DEFAULT_MIN_SPACING_MINUTES)
+        self.page_templates = {
+            page_name: SlotTemplate(
+                page_config.get("posting_hours", DEFAULT_POSTING_HOURS),
+                page_config.get("timezone", DEFAULT_TIMEZONE),
+                page_config.get("min_spacing_minutes", DEFAULT_MIN_SPACING_MINUTES)
+            )
+            for page_name, page_config in pages.items()
+        }
+        self.page_accounts = {page_name: page_config.get("socialbu_account_id") for page_name, page_config in pages.items()}
+        self.account_templates = {
+            self._account_key(self.page_accounts[page_name]): template
+            for page_name, template in self.page_templates.items()
+        }
+        self.ledgers = {}  # SocialBu account id (as str, None for no account) -> SlotCalendar
+        self.intervals = {}  # Ledger key -> ReservationIndex of its reservation times
+        self.shared_slots = []  # Slots of scheduled posts with no known account, blocked in every ledger
+        self.ledger_store = ledger_store
+        self.expired_through = {}  # Ledger key -> local day its past days were last expired for
+        self.lock = threading.RLock()
+        self.lookups = 0  # Free-slot searches, and the real time they took
+        self.lookup_seconds = 0.0
     
-    def get_next_available_slot(self, start_date=None):
-        """
-        Get the next available strategic time slot in Panama timezone
-        Returns: datetime object for the next available slot (timezone-aware)
-        """
+    @staticmethod
+    def _account_key(account):
+        """Ledger key for an account id (ids come back from the API as ints or strings)"""
+        return None if account is None else str(account)
+    
+    def _resolve_account(self, account=None, page=None):
+        """Account id to use, given either an account or a page key"""
+        return self.page_accounts[page] if page else account
+    
+    def template(self, account=None, page=None):
+        """Slot template of a page, or of the page an account belongs to"""
+        if page:
+            return self.page_templates[page]
+        return self.account_templates.get(self._account_key(account), self.default_template)
+    
+    def _ledger(self, account=None):
+        """Slot calendar for an account, created on first use"""
+        key = self._account_key(account)
+        if key not in self.ledgers:
+            template = self.template(key)
+            self.ledgers[key] = SlotCalendar(template.times)
+            self.intervals[key] = ReservationIndex(template.min_spacing_minutes * 60)
+            for slot in self.shared_slots:
+                self._add_reservation(key, slot)
+        return self.ledgers[key]
+    
+    def _add_reservation(self, key, scheduled_time):
+        """Record a reservation at any time and block the template slots too close to it"""
+        template = self.template(key)
+        calendar = self.ledgers[key]
+        index = self.intervals[key]
+        timestamp = template.timestamp(scheduled_time)
+        index.add(timestamp)
+        for day, time_of_day, _ in template.slots_near(timestamp, index.min_gap):
+            calendar.reserve(day, time_of_day)
+    
+    def _remove_reservation(self, key, scheduled_time):
+        """Drop a reservation and unblock nearby template slots no other reservation conflicts with"""
+        template = self.template(key)
+        calendar = self.ledgers[key]
+        index = self.intervals[key]
+        timestamp = template.timestamp(scheduled_time)
+        if not index.remove(timestamp):
+            return False
+        for day, time_of_day, slot_timestamp in template.slots_near(timestamp, index.min_gap):
+            if not index.conflicts(slot_timestamp):
+                calendar.release(day, time_of_day)
+        return True
+    
+    def _expire_past_days(self):
+        """Forget slots on days that are already over in each ledger's timezone"""
+        now = self.clock.time()
+        for key, calendar in self.ledgers.items():
+            template = self.template(key)
+            today = template.local_day(now)
+            if self.expired_through.get(key) == today:
+                continue  # Already expired today; most lookups stop here
+            calendar.expire(today)
+            template.expire(today)
+            self.intervals[key].expire(now - max(86400, self.intervals[key].min_gap))
+            self.expired_through[key] = today
+            self.shared_slots = [slot for slot in self.shared_slots if slot.timestamp() >= now - 86400]
+    
+    def _search_start(self, account, start_date=None):
+        """First day to search for free slots and the mask of slots on it that have already passed"""
+        template = self.template(account)
         if start_date is None:
-            # Get current time in Panama timezone
-            start_date = datetime.now(PANAMA_TZ)
+            now = self.clock.time()
         elif start_date.tzinfo is None:
-            # If naive datetime provided, localize it to Panama timezone
-            start_date = PANAMA_TZ.localize(start_date)
-        elif start_date.tzinfo != PANAMA_TZ:
-            # If different timezone, convert to Panama timezone
-            start_date = start_date.astimezone(PANAMA_TZ)
-        
-        # Start from today if we haven't passed all strategic times, otherwise start tomorrow
-        current_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        # If it's already past 6pm today, start from tomorrow
-        if start_date.hour >= 18:
-            current_date += timedelta(days=1)
-        
-        # Look for the next 365 days to find an available slot (extended from 30 days)
-        for day_offset in range(365):
-            check_date = current_date + timedelta(days=day_offset)
-            
-            for hour in self.strategic_times:
-                # Skip times that have already passed today
-                if day_offset == 0 and start_date.hour >= hour:
-                    continue
-                
-                slot_key = (check_date.date(), hour)
-                
-                if slot_key not in self.scheduled_slots:
-                    # Found an available slot - ensure it's timezone-aware
-                    scheduled_time = check_date.replace(hour=hour, minute=0, second=0, microsecond=0)
-                    self.scheduled_slots.add(slot_key)
-                    return scheduled_time
-        
-        # If no slot found in 365 days, return the first strategic time of the next day
-        # This ensures we ALWAYS return a strategic time (10am, 2pm, or 6pm)
-        next_year_date = current_date + timedelta(days=365)
-        fallback_time = next_year_date.replace(hour=self.strategic_times[0], minute=0, second=0, microsecond=0)
-        return fallback_time
-    
-    def mark_slot_as_used(self, scheduled_time):
-        """Mark a specific time slot as used"""
-        slot_key = (scheduled_time.date(), scheduled_time.hour)
-        self.scheduled_slots.add(slot_key)
-    
-    def get_scheduled_slots_info(self):
-        """Get information about currently scheduled slots"""
-        return sorted(list(self.scheduled_slots))
-    
-    def check_slot_availability(self, scheduled_time):
-        """Check if a specific time slot is available"""
-        slot_key = (scheduled_time.date(), scheduled_time.hour)
-        return slot_key not in self.scheduled_slots
+            now = template.timezone.localize(start_date).timestamp()
+        else:
+            now = start_date.timestamp()
+        self._expire_past_days()
+        
+        first_day = template.local_day(now)
+        passed_mask = self._ledger(account).time_mask(template.passed_times(first_day, now))
+        return first_day, passed_mask
+    
+    def get_next_available_slot(self, start_date=None, account=None, page=None):
+        """
+        Get the next available strategic time slot
+        Returns: datetime object for the next available slot (timezone-aware, in the page's timezone)
+        """
+        return self.reserve_slots(1, account=account, start_date=start_date, page=page)[0]
+    
+    def peek_next_slot(self, account=None, start_date=None, page=None):
+        """Next free strategic slot of an account's ledger, without reserving it"""
+        with self.lock:
+            account = self._resolve_account(account, page)
+            started = time.perf_counter()
+            day, time_of_day = self._ledger(account).next_free_slot(*self._search_start(account, start_date))
+            self._count_lookup(1, started)
+            return self.template(account).slot_datetime(day, time_of_day)
+    
+    def get_occupancy(self, start_day, end_day, account=None, page=None):
+        """List (day, used slots) for an account from start_day through end_day"""
+        with self.lock:
+            self._expire_past_days()
+            return list(self._ledger(self._resolve_account(account, page)).occupancy(start_day, end_day))
+    
+    def get_horizon(self, account=None, page=None):
+        """How far ahead an account's ledger is booked"""
+        with self.lock:
+            account = self._resolve_account(account, page)
+            self._expire_past_days()
+            calendar = self._ledger(account)
+            return {
+                "first_free_day": calendar.first_free_day(self.template(account).local_day(self.clock.time())),
+                "last_booked_day": calendar.last_booked_day(),
+                "booked_days": calendar.booked_days(),
+                "booked_slots": len(calendar)
+            }
+    
+    def reserve_slots(self, count, account=None, start_date=None, page=None):
+        """
+        Reserve the next `count` free strategic slots of an account's ledger
+        Slots are taken from the in-memory ledger under the lock and then claimed in the
+        ledger store outside it; a slot already claimed elsewhere stays blocked and is replaced.
+        Returns: list of timezone-aware datetimes in the page's timezone, earliest first
+        """
+        account = self._resolve_account(account, page)
+        reserved = []
+        while len(reserved) < count:
+            with self.lock:
+                taken = self._take_free_slots(count - len(reserved), account, start_date)
+            for slot_time in taken:
+                if self.ledger_store and not self.ledger_store.try_reserve(account, slot_time):
+                    continue  # Booked by another process since the ledger was loaded
+                reserved.append(slot_time)
+        reserved.sort()
+        return reserved
+    
+    def _take_free_slots(self, count, account, start_date=None):
+        """Reserve the next `count` free slots in the in-memory ledger in one pass (caller holds the lock)"""
+        key = self._account_key(account)
+        template = self.template(account)
+        calendar = self._ledger(account)
+        started = time.perf_counter()
+        first_day, passed_mask = self._search_start(account, start_date)
+        
+        taken = []
+        day = first_day
+        while len(taken) < count:
+            # Free calendar bits are at least min_spacing_minutes from every reservation
+            day, time_of_day = calendar.next_free_slot(day, passed_mask if day == first_day else 0)
+            slot_time = template.slot_datetime(day, time_of_day)
+            self._add_reservation(key, slot_time)
+            taken.append(slot_time)
+        self._count_lookup(count, started)
+        return taken
+    
+    def _count_lookup(self, count, started):
+        self.lookups += count
+        self.lookup_seconds += time.perf_counter() - started
+    
+    def lookup_stats(self):
+        """Free-slot searches so far and their mean cost in microseconds"""
+        with self.lock:
+            return {
+                "lookups": self.lookups,
+                "seconds": round(self.lookup_seconds, 6),
+                "mean_us": round(self.lookup_seconds / self.lookups * 1e6, 2) if self.lookups else 0.0
+            }
+    
+    def release_slots(self, slots, account=None, page=None):
+        """Release reserved slots that ended up unused; returns how many were released"""
+        account = self._resolve_account(account, page)
+        key = self._account_key(account)
+        with self.lock:
+            self._ledger(account)
+            template = self.template(account)
+            held = [slot for slot in slots if template.timestamp(slot) in self.intervals[key]]
+        # Free the store's claim before the in-memory slot, so a thread that takes it can claim it
+        if self.ledger_store:
+            for slot in held:
+                self.ledger_store.release(account, slot)
+        with self.lock:
+            return sum(1 for slot in held if self._remove_reservation(key, slot))
+    
+    def load_reservations(self):
+        """Fill the in-memory ledgers from the persistent ledger store (upcoming slots only)"""
+        with self.lock:
+            since = self.clock.now(pytz.utc) - timedelta(days=1)
+            self.ledger_store.expire(since)
+            loaded = 0
+            for account, slot in self.ledger_store.load(since):
+                self.mark_slot_as_used(slot, account=account)
+                loaded += 1
+            return loaded
+    
+    def get_free_slots(self, start_time, end_time, account=None, page=None):
+        """List an account's free strategic slots between two datetimes (inclusive)"""
+        with self.lock:
+            account = self._resolve_account(account, page)
+            template = self.template(account)
+            start_day, _ = template.locate(start_time)
+            end_day, _ = template.locate(end_time)
+            self._expire_past_days()
+        
+            free_slots = []
+            for day, time_of_day in self._ledger(account).free_slots(start_day, end_day):
+                slot_time = template.slot_datetime(day, time_of_day)
+                if start_time <= slot_time <= end_time:
+                    free_slots.append(slot_time)
+            return free_slots
+    
+    def mark_slot_as_used(self, scheduled_time, account=None):
+        """Mark a specific time slot as used (for every account when account is None)"""
+        with self.lock:
+            if account is None:
+                if scheduled_time.tzinfo is None:
+                    scheduled_time = self.default_template.timezone.localize(scheduled_time)
+                self.shared_slots.append(scheduled_time)
+                self._ledger(None)
+                keys = list(self.ledgers)
+            else:
+                self._ledger(account)
+                keys = [self._account_key(account)]
+            for key in keys:
+                self._add_reservation(key, scheduled_time)
+    
+    def get_scheduled_slots_info(self, account=None, page=None):
+        """Get an account's currently scheduled times as (date, "H:MM") tuples"""
+        with self.lock:
+            account = self._resolve_account(account, page)
+            template = self.template(account)
+            self._ledger(account)
+            scheduled = []
+            for timestamp in self.intervals[self._account_key(account)]:
+                local_time = datetime.fromtimestamp(timestamp, template.timezone)
+                scheduled.append((local_time.date(), f"{local_time.hour}:{local_time.minute:02d}"))
+            return scheduled
+    
+    def check_slot_availability(self, scheduled_time, account=None, page=None):
+        """Check if a time, at any minute, is at least min_spacing_minutes from an account's reservations"""
+        with self.lock:
+            account = self._resolve_account(account, page)
+            self._ledger(account)
+            timestamp = self.template(account).timestamp(scheduled_time)
+            return not self.intervals[self._account_key(account)].conflicts(timestamp)
 
 
 class ApifyService:
     """Service for interacting with Apify Instagram scraper (synchronous)"""
     
-    def __init__(self):
+    def __init__(self, cache=None):
         self.api_token = APIFY_API_TOKEN
         self.actor_id = APIFY_ACTOR_ID
+        self.cache = cache  # Optional ScrapeCache in front of actor runs
         # Initialize the Apify client
         if self.api_token and self.api_token != "your_apify_api_token_here":
             self.apify_client = ApifyClient(self.api_token)
         else:
             self.apify_client = None
     
-    def scrape_instagram_posts(self, usernames, max_posts=10):
+    def scrape_instagram_posts(self, usernames, max_posts=10, newer_than=None):
         """
         Scrape Instagram posts for given usernames using Apify client
         Returns a dict with username as key and list of posts as value
         """
+        processed_results = {}
+        for post in self.iter_instagram_posts(usernames, max_posts, newer_than):
+            processed_results.setdefault(post["owner_username"], []).append(post)
+        return processed_results
+    
+    def iter_instagram_posts(self, usernames, max_posts=10, newer_than=None):
+        """
+        Scrape Instagram posts for given usernames and yield normalized posts one at a time.
+        The run's dataset is paged through with iterate_items instead of being loaded whole.
+        Competitors with a fresh cache entry are served from the cache without an actor run.
+        newer_than (datetime, optional) asks the actor for posts newer than that time only.
+        """
         if not self.apify_client:
             print("⚠️  WARNING: Apify API token not configured. Using mock data.")
-            return self._get_mock_posts(usernames, max_posts)
+            yield from self._iter_mock_posts(usernames, max_posts)
+            return
         
+        cached_posts, usernames_to_scrape = self._lookup_cache(usernames, max_posts, newer_than)
+        for posts in cached_posts:
+            yield from posts
+        
+        if usernames_to_scrape:
+            yield from self._iter_actor_posts(usernames_to_scrape, max_posts, newer_than)
+    
+    def _iter_actor_posts(self, usernames, max_posts, newer_than=None):
+        """Run the Apify actor for the given usernames and yield normalized posts"""
         # Prepare input for Apify actor - using correct format for apify/instagram-post-scraper
         actor_input = {
             "username": usernames,  # Changed from "usernames" to "username"
             "resultsLimit": max_posts  # Changed from "resultsLimit" to match documentation
         }
+        if newer_than:
+            # Incremental scrape: only fetch posts newer than the competitors' watermark
+            actor_input["onlyPostsNewerThan"] = newer_than.strftime('%Y-%m-%dT%H:%M:%S')
         
+        yielded = False
         try:
             # Get actor client and run the actor
             actor_client = self.apify_client.actor(self.actor_id)
@@ -123,49 +390,56 @@ class ApifyService:
             
             if call_result is None:
                 print("❌ Apify actor run failed.")
-                return self._get_mock_posts(usernames, max_posts)
+                yield from self._iter_mock_posts(usernames, max_posts)
+                return
             
             print(f"✅ Apify actor run completed successfully.")
             
-            # Get results from the actor run's default dataset
+            # Page through the actor run's default dataset
             dataset_client = self.apify_client.dataset(call_result['defaultDatasetId'])
-            dataset_items = dataset_client.list_items()
+            cache_writer = self.cache.writer(usernames, max_posts, newer_than) if self.cache else None
+            for item in dataset_client.iterate_items():
+                yielded = True
+                post = self._normalize_item(item)
+                if cache_writer is not None:
+                    cache_writer.add(post)
+                yield post
             
-            # Process and return results
-            return self._process_apify_results(dataset_items.items)
+            if cache_writer is not None:
+                cache_writer.finish()
             
         except Exception as e:
             print(f"❌ Error scraping Instagram posts: {e}")
-            return self._get_mock_posts(usernames, max_posts)
+            # Only fall back to mock data if nothing real was produced yet
+            if not yielded:
+                yield from self._iter_mock_posts(usernames, max_posts)
     
-    def _process_apify_results(self, raw_results):
-        """Process raw Apify results into our format"""
-        processed_results = {}
-        
-        for item in raw_results:
-            # Get username from the queryUsername field or ownerUsername field
-            username = item.get("queryUsername") or item.get("ownerUsername", "")
-            if username not in processed_results:
-                processed_results[username] = []
-            
-            # Process posts - the apify/instagram-post-scraper returns different fields
-            post_data = {
-                "id": item.get("id"),
-                "url": item.get("url"),
-                "video_url": self._extract_video_url(item),  # Enhanced video extraction
-                "caption": item.get("caption", ""),
-                "likes_count": item.get("likesCount", 0),
-                "comments_count": item.get("commentsCount", 0),
-                "views_count": item.get("videoViewCount", 0),  # For video posts
-                "timestamp": item.get("timestamp"),
-                "owner_username": username,
-                "type": item.get("type", "Unknown"),  # Image, Video, Sidecar, etc.
-                "short_code": item.get("shortCode", ""),
-                "display_url": item.get("displayUrl", "")
-            }
-            processed_results[username].append(post_data)
+    def _lookup_cache(self, usernames, max_posts, newer_than=None):
+        """Split usernames into cached post lists and usernames that still need scraping"""
+        if not self.cache:
+            return [], list(usernames)
+        return self.cache.lookup(usernames, max_posts, newer_than)
+    
+    def _normalize_item(self, item):
+        """Convert one raw Apify dataset item into our post format"""
+        # Get username from the queryUsername field or ownerUsername field
+        username = item.get("queryUsername") or item.get("ownerUsername", "")
         
-        return processed_results
+        # Process posts - the apify/instagram-post-scraper returns different fields
+        return {
+            "id": item.get("id"),
+            "url": item.get("url"),
+            "video_url": self._extract_video_url(item),  # Enhanced video extraction
+            "caption": item.get("caption", ""),
+            "likes_count": item.get("likesCount", 0),
+            "comments_count": item.get("commentsCount", 0),
+            "views_count": item.get("videoViewCount", 0),  # For video posts
+            "timestamp": item.get("timestamp"),
+            "owner_username": username,
+            "type": item.get("type", "Unknown"),  # Image, Video, Sidecar, etc.
+            "short_code": item.get("shortCode", ""),
+            "display_url": item.get("displayUrl", "")
+        }
     
     def _extract_video_url(self, item):
         """Enhanced video URL extraction for videos and carousels"""
@@ -215,35 +489,70 @@ class ApifyService:
             mock_results[username] = mock_posts
         
         return mock_results
+    
+    def _iter_mock_posts(self, usernames, max_posts):
+        """Yield mock posts one at a time"""
+        for posts in self._get_mock_posts(usernames, max_posts).values():
+            yield from posts
 
 
 class ApifyServiceAsync:
     """Service for interacting with Apify Instagram scraper (asynchronous)"""
     
-    def __init__(self):
+    def __init__(self, cache=None):
         self.api_token = APIFY_API_TOKEN
         self.actor_id = APIFY_ACTOR_ID
+        self.cache = cache  # Optional ScrapeCache in front of actor runs
         # Initialize the async Apify client
         if self.api_token and self.api_token != "your_apify_api_token_here":
             self.apify_client = ApifyClientAsync(self.api_token)
         else:
             self.apify_client = None
     
-    async def scrape_instagram_posts(self, usernames, max_posts=10):
+    async def scrape_instagram_posts(self, usernames, max_posts=10, newer_than=None):
         """
         Scrape Instagram posts for given usernames using async Apify client
         Returns a dict with username as key and list of posts as value
         """
+        processed_results = {}
+        async for post in self.iter_instagram_posts(usernames, max_posts, newer_than):
+            processed_results.setdefault(post["owner_username"], []).append(post)
+        return processed_results
+    
+    async def iter_instagram_posts(self, usernames, max_posts=10, newer_than=None):
+        """
+        Scrape Instagram posts for given usernames and yield normalized posts one at a time.
+        The run's dataset is paged through with iterate_items instead of being loaded whole.
+        Competitors with a fresh cache entry are served from the cache without an actor run.
+        newer_than (datetime, optional) asks the actor for posts newer than that time only.
+        """
         if not self.apify_client:
             print("⚠️  WARNING: Apify API token not configured. Using mock data.")
-            return self._get_mock_posts(usernames, max_posts)
+            for post in self._iter_mock_posts(usernames, max_posts):
+                yield post
+            return
         
+        cached_posts, usernames_to_scrape = self._lookup_cache(usernames, max_posts, newer_than)
+        for posts in cached_posts:
+            for post in posts:
+                yield post
+        
+        if usernames_to_scrape:
+            async for post in self._iter_actor_posts(usernames_to_scrape, max_posts, newer_than):
+                yield post
+    
+    async def _iter_actor_posts(self, usernames, max_posts, newer_than=None):
+        """Run the Apify actor for the given usernames and yield normalized posts"""
         # Prepare input for Apify actor - using correct format for apify/instagram-post-scraper
         actor_input = {
             "username": usernames,  # Changed from "usernames" to "username"
             "resultsLimit": max_posts  # Changed from "resultsLimit" to match documentation
         }
+        if newer_than:
+            # Incremental scrape: only fetch posts newer than the competitors' watermark
+            actor_input["onlyPostsNewerThan"] = newer_than.strftime('%Y-%m-%dT%H:%M:%S')
         
+        yielded = False
         try:
             # Get actor client and run the actor
             actor_client = self.apify_client.actor(self.actor_id)
@@ -254,49 +563,58 @@ class ApifyServiceAsync:
             
             if call_result is None:
                 print("❌ Apify actor run failed.")
-                return self._get_mock_posts(usernames, max_posts)
+                for post in self._iter_mock_posts(usernames, max_posts):
+                    yield post
+                return
             
             print(f"✅ Async Apify actor run completed successfully.")
             
-            # Get results from the actor run's default dataset
+            # Page through the actor run's default dataset
             dataset_client = self.apify_client.dataset(call_result['defaultDatasetId'])
-            dataset_items = await dataset_client.list_items()
+            cache_writer = self.cache.writer(usernames, max_posts, newer_than) if self.cache else None
+            async for item in dataset_client.iterate_items():
+                yielded = True
+                post = self._normalize_item(item)
+                if cache_writer is not None:
+                    cache_writer.add(post)
+                yield post
             
-            # Process and return results
-            return self._process_apify_results(dataset_items.items)
+            if cache_writer is not None:
+                cache_writer.finish()
             
         except Exception as e:
             print(f"❌ Error scraping Instagram posts: {e}")
-            return self._get_mock_posts(usernames, max_posts)
+            # Only fall back to mock data if nothing real was produced yet
+            if not yielded:
+                for post in self._iter_mock_posts(usernames, max_posts):
+                    yield post
     
-    def _process_apify_results(self, raw_results):
-        """Process raw Apify results into our format"""
-        processed_results = {}
-        
-        for item in raw_results:
-            # Get username from the queryUsername field or ownerUsername field
-            username = item.get("queryUsername") or item.get("ownerUsername", "")
-            if username not in processed_results:
-                processed_results[username] = []
-            
-            # Process posts - the apify/instagram-post-scraper returns different fields
-            post_data = {
-                "id": item.get("id"),
-                "url": item.get("url"),
-                "video_url": self._extract_video_url(item),  # Enhanced video extraction
-                "caption": item.get("caption", ""),
-                "likes_count": item.get("likesCount", 0),
-                "comments_count": item.get("commentsCount", 0),
-                "views_count": item.get("videoViewCount", 0),  # For video posts
-                "timestamp": item.get("timestamp"),
-                "owner_username": username,
-                "type": item.get("type", "Unknown"),  # Image, Video, Sidecar, etc.
-                "short_code": item.get("shortCode", ""),
-                "display_url": item.get("displayUrl", "")
-            }
-            processed_results[username].append(post_data)
+    def _lookup_cache(self, usernames, max_posts, newer_than=None):
+        """Split usernames into cached post lists and usernames that still need scraping"""
+        if not self.cache:
+            return [], list(usernames)
+        return self.cache.lookup(usernames, max_posts, newer_than)
+    
+    def _normalize_item(self, item):
+        """Convert one raw Apify dataset item into our post format"""
+        # Get username from the queryUsername field or ownerUsername field
+        username = item.get("queryUsername") or item.get("ownerUsername", "")
         
-        return processed_results
+        # Process posts - the apify/instagram-post-scraper returns different fields
+        return {
+            "id": item.get("id"),
+            "url": item.get("url"),
+            "video_url": self._extract_video_url(item),  # Enhanced video extraction
+            "caption": item.get("caption", ""),
+            "likes_count": item.get("likesCount", 0),
+            "comments_count": item.get("commentsCount", 0),
+            "views_count": item.get("videoViewCount", 0),  # For video posts
+            "timestamp": item.get("timestamp"),
+            "owner_username": username,
+            "type": item.get("type", "Unknown"),  # Image, Video, Sidecar, etc.
+            "short_code": item.get("shortCode", ""),
+            "display_url": item.get("displayUrl", "")
+        }
     
     def _extract_video_url(self, item):
         """Enhanced video URL extraction for videos and carousels"""
@@ -346,22 +664,33 @@ class ApifyServiceAsync:
             mock_results[username] = mock_posts
         
         return mock_results
+    
+    def _iter_mock_posts(self, usernames, max_posts):
+        """Yield mock posts one at a time"""
+        for posts in self._get_mock_posts(usernames, max_posts).values():
+            yield from posts
 
 
 class SocialBuService:
-    """Service for interacting with SocialBu API"""
+    """
+    Service for interacting with SocialBu API
+    All requests (API calls, CDN downloads, signed-URL uploads) go through one
+    HttpTransport, which gives each worker thread its own keep-alive sessions; slot
+    reservations go through the scheduler's lock.
+    """
     
-    def __init__(self):
+    def __init__(self, clock=None, strategic_scheduler=None, transport=None, media_cache=None):
         self.api_token = SOCIALBU_API_TOKEN
         self.base_url = "https://socialbu.com/api/v1"
-        self.session = requests.Session()
-        self.session.headers.update({
+        self.transport = transport or HttpTransport(api_headers={
             "Authorization": f"Bearer {self.api_token}",
             "Content-Type": "application/json",
             "User-Agent": "SocialBu-API-Client/1.0",
             "Accept": "application/json"
         })
-        self.strategic_scheduler = StrategicScheduler()
+        self.clock = clock or SystemClock()
+        self.strategic_scheduler = strategic_scheduler or StrategicScheduler(ledger_store=get_slot_ledger(), clock=self.clock)
+        self.media_cache = media_cache if media_cache is not None else get_media_cache()
         
         # Load existing scheduled posts to prevent conflicts
         try:
@@ -369,6 +698,11 @@ class SocialBuService:
         except:
             pass  # Fail silently if can't load schedules
     
+    @property
+    def session(self):
+        """The calling thread's pooled session for the SocialBu API"""
+        return self.transport.api
+    
     def _make_request(self, method, endpoint, **kwargs):
         """Make API request with proper error handling"""
         url = f"{self.base_url}{endpoint}"
@@ -440,7 +774,7 @@ class SocialBuService:
             print(f"❌ Error getting accounts: {e}")
             return {"success": False, "error": str(e)}
     
-    def schedule_post(self, content, accounts, schedule_time=None, video_url=None, media_options=None):
+    def schedule_post(self, content, accounts, schedule_time=None, video_url=None, media_options=None, upload_token=None):
         """
         Schedule a post to be published at a specific time, with optional media
         
@@ -450,26 +784,26 @@ class SocialBuService:
             schedule_time (datetime, optional): When to publish. If None, publishes now
             video_url (str, optional): URL of video to download and attach
             media_options (dict, optional): Additional media options (post_as_reel, etc.)
+            upload_token (str, optional): Token of media already uploaded with process_video_upload
             
         Returns:
             dict: Response from the SocialBu API
         """
         # Format the schedule time properly with timezone handling
         if schedule_time:
-            # Ensure schedule_time is timezone-aware in Panama timezone
+            # Ensure schedule_time is timezone-aware in SocialBu's timezone
             if schedule_time.tzinfo is None:
-                # If naive, assume it's in Panama timezone
-                schedule_time = PANAMA_TZ.localize(schedule_time)
-            elif schedule_time.tzinfo != PANAMA_TZ:
-                # If in different timezone, convert to Panama timezone
-                schedule_time = schedule_time.astimezone(PANAMA_TZ)
+                # If naive, assume it's in SocialBu's timezone
+                schedule_time = SOCIALBU_TZ.localize(schedule_time)
+            elif schedule_time.tzinfo != SOCIALBU_TZ:
+                # If in a different timezone (e.g. a page's slot template), convert
+                schedule_time = schedule_time.astimezone(SOCIALBU_TZ)
             
             # Format for SocialBu API (Y-m-d H:i:s format without timezone)
             publish_at = schedule_time.strftime('%Y-%m-%d %H:%M:%S')
         else:
-            # For immediate posting, use current time in Panama timezone
-            now_panama = datetime.now(PANAMA_TZ)
-            publish_at = now_panama.strftime('%Y-%m-%d %H:%M:%S')
+            # For immediate posting, use current time in SocialBu's timezone
+            publish_at = self.clock.now(SOCIALBU_TZ).strftime('%Y-%m-%d %H:%M:%S')
         
         data = {
             "accounts": accounts,
@@ -477,22 +811,23 @@ class SocialBuService:
             "publish_at": publish_at
         }
         
-        # Handle media upload if video_url is provided
-        if video_url:
+        # Handle media upload if video_url is provided (and the media wasn't uploaded already)
+        if video_url and not upload_token:
             print(f"🎬 Processing video for upload: {video_url}")
             upload_token = self.process_video_upload(video_url)
             
             if upload_token:
-                data["existing_attachments"] = [{"upload_token": upload_token}]
                 print(f"✅ Video upload successful, token: {upload_token[:20]}...")
-                
-                # Add Instagram-specific options if provided
-                if media_options:
-                    data["options"] = media_options
-                    
             else:
                 print("⚠️  Video upload failed, posting without media")
         
+        if upload_token:
+            data["existing_attachments"] = [{"upload_token": upload_token}]
+            
+            # Add Instagram-specific options if provided
+            if media_options:
+                data["options"] = media_options
+        
         print(f"🔄 Attempting to schedule post to SocialBu...")
         print(f"   Data: {json.dumps({k: v for k, v in data.items() if k != 'existing_attachments'}, indent=2)}")
         if 'existing_attachments' in data:
@@ -514,7 +849,8 @@ class SocialBuService:
                 "error": f"Exception occurred: {str(e)}"
             }
     
-    def schedule_post_with_strategic_timing(self, content, accounts, video_url=None, media_options=None):
+    def schedule_post_with_strategic_timing(self, content, accounts, video_url=None, media_options=None,
+                                            slot=None, upload_token=None):
         """
         Schedule a post using strategic timing (10am, 2pm, 6pm slots)
         
@@ -523,12 +859,14 @@ class SocialBuService:
             accounts (list): List of account IDs to post to
             video_url (str, optional): URL of video to download and attach
             media_options (dict, optional): Additional media options
+            slot (datetime, optional): Slot already reserved with reserve_slots
+            upload_token (str, optional): Token of media already uploaded with process_video_upload
             
         Returns:
             dict: Response from the SocialBu API with scheduled time info
         """
-        # Get next available strategic time slot
-        next_slot = self.strategic_scheduler.get_next_available_slot()
+        # Get next available strategic time slot in the (first) account's ledger
+        next_slot = slot or self.strategic_scheduler.get_next_available_slot(account=accounts[0] if accounts else None)
         
         print(f"📅 Strategic scheduling: Next available slot is {next_slot.strftime('%Y-%m-%d %H:%M')}")
         
@@ -538,7 +876,8 @@ class SocialBuService:
             accounts=accounts,
             schedule_time=next_slot,
             video_url=video_url,
-            media_options=media_options
+            media_options=media_options,
+            upload_token=upload_token
         )
         
         # Add strategic scheduling info to result
@@ -547,41 +886,40 @@ class SocialBuService:
             
         return result
     
-    def process_video_upload(self, video_url, max_retries=3):
+    def process_video_upload(self, video_url, max_retries=3, cache_key=None):
         """
         Complete video processing: download -> upload -> get token
+        In pipe mode (MEDIA_PIPE_MODE) the download is streamed straight into the upload.
+        Downloaded videos are kept in the media cache, so retries and reruns upload
+        the cached bytes instead of downloading them again.
         
         Args:
             video_url (str): URL of the video to process
             max_retries (int): Maximum number of retry attempts
+            cache_key (str, optional): Media cache key, e.g. the Instagram shortcode
+                (defaults to the CDN file name)
             
         Returns:
             str: Upload token if successful, None if failed
         """
+        cache_key = cache_key or self._video_filename(video_url)
         for attempt in range(max_retries):
             try:
                 print(f"🔄 Video processing attempt {attempt + 1}/{max_retries}")
                 
-                # Step 1: Download video
-                temp_file_path, mime_type = self.download_video(video_url)
-                if not temp_file_path:
-                    print(f"❌ Failed to download video on attempt {attempt + 1}")
-                    continue
+                cached = self.media_cache.get(cache_key) if self.media_cache else None
+                if cached:
+                    upload_token = self.upload_cached_video(cached, video_url)
+                elif MEDIA_PIPE_MODE:
+                    upload_token = self.pipe_video_upload(video_url, cache_key=cache_key)
+                else:
+                    upload_token = self.download_and_upload_video(video_url, cache_key=cache_key)
                 
-                try:
-                    # Step 2: Upload to SocialBu
-                    upload_token = self.upload_video_to_socialbu(temp_file_path, mime_type)
-                    
-                    if upload_token:
-                        print(f"✅ Video processing successful on attempt {attempt + 1}")
-                        return upload_token
-                    else:
-                        print(f"❌ Upload failed on attempt {attempt + 1}")
-                        
-                finally:
-                    # Always clean up temp file
-                    if temp_file_path and os.path.exists(temp_file_path):
-                        os.unlink(temp_file_path)
+                if upload_token:
+                    print(f"✅ Video processing successful on attempt {attempt + 1}")
+                    return upload_token
+                else:
+                    print(f"❌ Upload failed on attempt {attempt + 1}")
                         
             except Exception as e:
                 print(f"❌ Video processing error on attempt {attempt + 1}: {e}")
@@ -595,81 +933,188 @@ class SocialBuService:
         print(f"❌ Video processing failed after {max_retries} attempts")
         return None
     
-    def download_video(self, video_url, timeout=30):
+    def download_and_upload_video(self, video_url, cache_key=None):
+        """Download a video into a MediaBuffer, then upload it to SocialBu; returns the upload token or None"""
+        buffer = self.download_video(video_url)
+        if buffer is None:
+            print("❌ Failed to download video")
+            return None
+        
+        with buffer:
+            self._cache_buffer(cache_key, buffer)
+            return self.upload_video_to_socialbu(buffer)
+    
+    def upload_cached_video(self, cached, video_url):
+        """Upload a video from the media cache ((file, size, mime_type) from MediaCache.get); returns the upload token or None"""
+        media_file, file_size, mime_type = cached
+        with media_file:
+            print(f"♻️  Reusing cached video ({file_size / (1024*1024):.2f} MB), skipping the download")
+            body = StreamedBody(media_file, file_size, MEDIA_PIPE_CHUNK_SIZE)
+            return self.upload_body_to_socialbu(body, self._video_filename(video_url), mime_type, file_size)
+    
+    def _cache_buffer(self, cache_key, buffer):
+        """Copy a downloaded MediaBuffer into the media cache; failures only cost the cache entry"""
+        if not (self.media_cache and cache_key):
+            return
+        try:
+            self.media_cache.store_buffer(cache_key, buffer)
+        except OSError as e:
+            print(f"⚠️  Warning: Could not cache video: {e}")
+    
+    def _cache_writer(self, cache_key, mime_type):
+        """MediaCacheWriter to tee a piped download into, or None"""
+        if not (self.media_cache and cache_key):
+            return None
+        try:
+            return self.media_cache.writer(cache_key, mime_type)
+        except OSError as e:
+            print(f"⚠️  Warning: Could not cache video: {e}")
+            return None
+    
+    def pipe_video_upload(self, video_url, timeout=30, cache_key=None):
         """
-        Download video from URL to temporary file
+        Stream a video from the CDN straight into SocialBu's signed upload URL, without a temp file.
+        The signed PUT needs the size up front, so when the CDN sends no Content-Length
+        (or a compressed body) the video is downloaded into a MediaBuffer first.
+        The piped bytes are teed into the media cache under cache_key, and the entry
+        is kept only if the whole video was read, whether or not the upload succeeded.
         
-        Args:
-            video_url (str): URL of the video to download
-            timeout (int): Request timeout in seconds
+        Returns:
+            str: Upload token if successful, None if failed
+        """
+        response, mime_type = self.open_video_stream(video_url, timeout)
+        if response is None:
+            return None
+        
+        with response:
+            content_length = response.headers.get('content-length')
+            encoding = response.headers.get('content-encoding', 'identity').lower()
+            if not content_length or encoding != 'identity':
+                print("   ⚠️  CDN sent no usable Content-Length, buffering the video first")
+                with self._buffer_video_stream(response, video_url, mime_type) as buffer:
+                    self._cache_buffer(cache_key, buffer)
+                    return self.upload_video_to_socialbu(buffer)
             
+            filename = self._video_filename(video_url)
+            writer = self._cache_writer(cache_key, mime_type)
+            body = StreamedBody(response.raw, int(content_length), MEDIA_PIPE_CHUNK_SIZE, sink=writer)
+            try:
+                return self.upload_body_to_socialbu(body, filename, mime_type, len(body))
+            finally:
+                if writer is not None:
+                    try:
+                        if body.complete:
+                            writer.commit()
+                        else:
+                            writer.discard()
+                    except OSError as e:
+                        print(f"⚠️  Warning: Could not cache video: {e}")
+    
+    def open_video_stream(self, video_url, timeout=30):
+        """
+        Start a streamed download of a video from the CDN
+        
         Returns:
-            tuple: (temp_file_path, mime_type) or (None, None) if failed
+            tuple: (streamed response, mime_type) or (None, None) if failed
         """
         try:
             print(f"📥 Downloading video from: {video_url[:80]}...")
             
-            # Create a temporary file
-            temp_dir = tempfile.gettempdir()
-            temp_file = tempfile.NamedTemporaryFile(
-                delete=False, 
-                suffix='.mp4',
-                dir=temp_dir
-            )
-            temp_file_path = temp_file.name
-            temp_file.close()
-            
-            # Download with streaming to handle large files
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            
-            response = requests.get(video_url, headers=headers, stream=True, timeout=timeout)
+            # The CDN session sends a browser User-Agent
+            response = self.transport.cdn.get(video_url, stream=True, timeout=timeout)
             response.raise_for_status()
             
             # Get content type
             content_type = response.headers.get('content-type', 'video/mp4')
             if 'video' not in content_type:
                 content_type = 'video/mp4'  # Default for Instagram videos
-                
-            # Write to temp file
-            with open(temp_file_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-            
-            file_size = os.path.getsize(temp_file_path)
-            print(f"✅ Video downloaded: {file_size / (1024*1024):.2f} MB")
             
-            return temp_file_path, content_type
+            return response, content_type
             
         except requests.exceptions.RequestException as e:
             print(f"❌ Network error downloading video: {e}")
         except Exception as e:
             print(f"❌ Error downloading video: {e}")
-            
-        # Clean up on error
-        if 'temp_file_path' in locals() and os.path.exists(temp_file_path):
-            os.unlink(temp_file_path)
-            
+        
         return None, None
     
-    def upload_video_to_socialbu(self, file_path, mime_type, max_wait_time=300):
+    @staticmethod
+    def _video_filename(video_url):
+        return os.path.basename(urlparse(video_url).path) or 'video.mp4'
+    
+    def _buffer_video_stream(self, response, video_url, mime_type):
+        """Read a streamed response body into a MediaBuffer (spooled to disk only past MEDIA_SPOOL_MAX_MEMORY)"""
+        buffer = MediaBuffer(self._video_filename(video_url), mime_type)
+        try:
+            buffer.fill(response.iter_content(chunk_size=MEDIA_PIPE_CHUNK_SIZE))
+        except Exception:
+            buffer.close()
+            raise
+        
+        print(f"✅ Video downloaded: {len(buffer) / (1024*1024):.2f} MB ({'on disk' if buffer.on_disk else 'in memory'})")
+        return buffer
+    
+    def download_video(self, video_url, timeout=30):
+        """
+        Download video from URL into a MediaBuffer
+        
+        Args:
+            video_url (str): URL of the video to download
+            timeout (int): Request timeout in seconds
+            
+        Returns:
+            MediaBuffer: the video (close it when done), or None if failed
+        """
+        response, content_type = self.open_video_stream(video_url, timeout)
+        if response is None:
+            return None
+        
+        try:
+            with response:
+                return self._buffer_video_stream(response, video_url, content_type)
+        except requests.exceptions.RequestException as e:
+            print(f"❌ Network error downloading video: {e}")
+        except Exception as e:
+            print(f"❌ Error downloading video: {e}")
+        
+        return None
+    
+    def upload_video_to_socialbu(self, media, mime_type=None, max_wait_time=300):
         """
         Upload video to SocialBu using their 3-step process
         
         Args:
-            file_path (str): Path to the video file
-            mime_type (str): MIME type of the file
+            media (MediaBuffer or str): Buffer from download_video, or path to a video file
+            mime_type (str, optional): MIME type of the file (defaults to the buffer's)
             max_wait_time (int): Maximum time to wait for processing (seconds)
             
+        Returns:
+            str: Upload token if successful, None if failed
+        """
+        if isinstance(media, MediaBuffer):
+            return self.upload_body_to_socialbu(
+                media.body(), media.name, mime_type or media.mime_type, len(media), max_wait_time
+            )
+        
+        file_path = media
+        try:
+            with open(file_path, 'rb') as f:
+                return self.upload_body_to_socialbu(
+                    f, os.path.basename(file_path), mime_type, os.path.getsize(file_path), max_wait_time
+                )
+        except OSError as e:
+            print(f"❌ Error reading video file: {e}")
+            return None
+    
+    def upload_body_to_socialbu(self, body, filename, mime_type, file_size, max_wait_time=300):
+        """
+        Upload a video body (open file or StreamedBody of file_size bytes) to SocialBu
+        using their 3-step process
+        
         Returns:
             str: Upload token if successful, None if failed
         """
         try:
-            filename = os.path.basename(file_path)
-            file_size = os.path.getsize(file_path)
-            
             print(f"📤 Starting SocialBu upload process for: {filename} ({file_size / (1024*1024):.2f} MB)")
             
             # Step 1: Initialize upload
@@ -685,8 +1130,8 @@ class SocialBuService:
             
             # Step 2: Upload file to signed URL
             print("   Step 2: Uploading file...")
-            upload_success = self.upload_file_to_signed_url(
-                file_path, signed_url, mime_type, file_size
+            upload_success = self.upload_body_to_signed_url(
+                body, signed_url, mime_type, file_size
             )
             
             if not upload_success:
@@ -708,16 +1153,10 @@ class SocialBuService:
             print(f"❌ Error in upload process: {e}")
             return None
     
-    def upload_file_to_signed_url(self, file_path, signed_url, mime_type, file_size):
+    def upload_body_to_signed_url(self, body, signed_url, mime_type, file_size):
         """
-        Upload file to the S3 signed URL (Step 2 of SocialBu upload)
+        PUT an open file or StreamedBody of file_size bytes to the S3 signed URL
         
-        Args:
-            file_path (str): Path to the file
-            signed_url (str): Pre-signed URL from SocialBu
-            mime_type (str): MIME type of the file
-            file_size (int): Size of the file in bytes
-            
         Returns:
             bool: True if successful, False otherwise
         """
@@ -728,13 +1167,12 @@ class SocialBuService:
                 'x-amz-acl': 'private'
             }
             
-            with open(file_path, 'rb') as f:
-                response = requests.put(
-                    signed_url,
-                    data=f,
-                    headers=headers,
-                    timeout=120  # 2 minute timeout for large files
-                )
+            response = self.transport.s3.put(
+                signed_url,
+                data=body,
+                headers=headers,
+                timeout=120  # 2 minute timeout for large files
+            )
             
             if response.status_code in [200, 204]:
                 print(f"✅ File uploaded successfully to signed URL")
@@ -791,11 +1229,6 @@ class SocialBuService:
         """
         if not self.api_token:
             return {"success": False, "error": "No API token configured"}
-            
-        headers = {
-            "Authorization": f"Bearer {self.api_token}",
-            "Content-Type": "application/json"
-        }
         
         upload_data = {
             "name": file_name,
@@ -803,10 +1236,10 @@ class SocialBuService:
         }
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/upload_media",
-                headers=headers,
-                json=upload_data
+                json=upload_data,
+                timeout=30
             )
             response.raise_for_status()
             return response.json()
@@ -820,31 +1253,45 @@ class SocialBuService:
         """
         if not self.api_token:
             return {"success": False, "error": "No API token configured"}
-            
-        headers = {
-            "Authorization": f"Bearer {self.api_token}",
-            "Content-Type": "application/json"
-        }
         
         try:
-            response = requests.get(
-                f"{self.base_url}/upload_media/status?key={key}",
-                headers=headers
+            # Polled every few seconds while SocialBu processes an upload; reuses a pooled connection
+            response = self.session.get(
+                f"{self.base_url}/upload_media/status",
+                params={"key": key},
+                timeout=30
             )
             response.raise_for_status()
             return response.json()
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    def get_strategic_schedule_info(self):
-        """Get information about strategic scheduling"""
-        scheduled_slots = self.strategic_scheduler.get_scheduled_slots_info()
-        next_slot = self.strategic_scheduler.get_next_available_slot()
+    def get_strategic_schedule_info(self, account=None, occupancy_days=7, page=None):
+        """
+        Get information about strategic scheduling for an account's (or page's) slot ledger.
+        Read-only: the next available slot is peeked at, not reserved.
+        """
+        scheduler = self.strategic_scheduler
+        template = scheduler.template(account, page=page)
+        with scheduler.lock:  # One consistent snapshot while other threads reserve
+            scheduled_slots = scheduler.get_scheduled_slots_info(account=account, page=page)
+            next_slot = scheduler.peek_next_slot(account=account, page=page)
+            today = scheduler.clock.now(template.timezone).date()
+            occupancy = scheduler.get_occupancy(today, today + timedelta(days=occupancy_days - 1), account=account, page=page)
+            horizon = scheduler.get_horizon(account=account, page=page)
         
         return {
-            "strategic_times": [f"{hour}:00" for hour in self.strategic_scheduler.strategic_times],
+            "strategic_times": template.labels(),
+            "timezone": template.timezone_name,
             "next_available_slot": next_slot.strftime('%Y-%m-%d %H:%M'),
-            "scheduled_slots": [(date.isoformat(), hour) for date, hour in scheduled_slots]
+            "scheduled_slots": [(date.isoformat(), slot_time) for date, slot_time in scheduled_slots],
+            "occupancy": [(date.isoformat(), used) for date, used in occupancy],
+            "horizon": {
+                "first_free_day": horizon["first_free_day"].isoformat(),
+                "last_booked_day": horizon["last_booked_day"].isoformat() if horizon["last_booked_day"] else None,
+                "booked_days": horizon["booked_days"],
+                "booked_slots": horizon["booked_slots"]
+            }
         }
 
     def test_connection(self):
@@ -871,65 +1318,214 @@ class SocialBuService:
 
     def get_scheduled_posts(self):
         """Get scheduled posts from SocialBu to check for time conflicts"""
+        return [scheduled_dt for _, scheduled_dt in self.get_scheduled_post_slots() or []]
+    
+    def get_scheduled_post_slots(self):
+        """
+        Get the publish time of each scheduled SocialBu post with the accounts it goes to
+        Returns: list of (list of account ids, timezone-aware datetime) tuples, or None if the request failed
+        """
         try:
-            response = self._make_request("GET", "/posts?status=scheduled")
-            
-            if response.get("success") or isinstance(response, list):
-                posts = response.get("data", []) if isinstance(response, dict) else response
-                scheduled_times = []
-                
-                for post in posts:
-                    publish_at = post.get("publish_at")
-                    if publish_at:
-                        try:
-                            # Parse the schedule time
-                            scheduled_dt = datetime.strptime(publish_at, "%Y-%m-%d %H:%M:%S")
-                            # Convert to Panama timezone if needed
-                            if scheduled_dt.tzinfo is None:
-                                scheduled_dt = PANAMA_TZ.localize(scheduled_dt)
-                            scheduled_times.append(scheduled_dt)
-                        except ValueError:
-                            continue
-                
-                return scheduled_times
-            
-            return []
-                
+            posts, _, _ = self.fetch_scheduled_posts()
+            return [(account_ids, scheduled_dt) for _, account_ids, scheduled_dt in posts]
         except Exception as e:
             print(f"⚠️  Warning: Could not fetch scheduled posts: {e}")
-            return []
+            return None
+    
+    def fetch_scheduled_posts(self, page_validators=None):
+        """
+        Fetch every page of scheduled posts. Page 1 is always fetched since it carries the
+        page count; the remaining pages are fetched concurrently, each with the ETag and
+        Last-Modified validators it returned last time (page_validators), so unchanged
+        pages come back as an empty 304.
+        
+        Returns: (list of (post id, account ids, publish datetime) for changed pages,
+                  set of post ids on unchanged pages,
+                  validators to pass in next time)
+        """
+        page_validators = page_validators or {}
+        posts = []
+        unchanged_post_ids = set()
+        new_validators = {}
+        
+        def collect(page, payload, headers):
+            page_posts = [parsed for parsed in map(self._parse_scheduled_post, self._page_items(payload)) if parsed]
+            posts.extend(page_posts)
+            new_validators[str(page)] = {
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+                "post_ids": [post_id for post_id, _, _ in page_posts if post_id]
+            }
+        
+        payload, headers = self._fetch_scheduled_posts_page(1)
+        collect(1, payload, headers)
+        last_page = self._last_page(payload)
+        
+        if last_page > 1:
+            pages = range(2, last_page + 1)
+            with ThreadPoolExecutor(max_workers=min(SOCIALBU_SYNC_MAX_WORKERS, len(pages))) as executor:
+                responses = executor.map(
+                    lambda page: self._fetch_scheduled_posts_page(page, page_validators.get(str(page))), pages
+                )
+                for page, (page_payload, page_headers) in zip(pages, responses):
+                    if page_payload is None:
+                        # Unchanged since the last sync: keep its validators and post ids
+                        new_validators[str(page)] = page_validators[str(page)]
+                        unchanged_post_ids.update(page_validators[str(page)]["post_ids"])
+                    else:
+                        collect(page, page_payload, page_headers)
+        else:
+            # No page count given: follow next-page links one at a time
+            page = 1
+            while self._has_next_page(payload):
+                page += 1
+                payload, headers = self._fetch_scheduled_posts_page(page)
+                collect(page, payload, headers)
+        
+        return posts, unchanged_post_ids, new_validators
+    
+    def _fetch_scheduled_posts_page(self, page, validators=None):
+        """
+        Fetch one page of scheduled posts, conditionally when validators are given
+        Returns: (payload, or None if the page is unchanged, response headers)
+        """
+        headers = {}
+        if validators and validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators and validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        
+        response = self.session.get(
+            f"{self.base_url}/posts",
+            params={"status": "scheduled", "page": page},
+            headers=headers,
+            timeout=30
+        )
+        if response.status_code == 304:
+            return None, response.headers
+        if response.status_code != 200:
+            raise ValueError(f"API returned status {response.status_code} for page {page}")
+        return response.json(), response.headers
+    
+    @staticmethod
+    def _page_items(payload):
+        """Posts in one page of a list response"""
+        if isinstance(payload, list):
+            return payload
+        return payload.get("data") or payload.get("items") or []
+    
+    @staticmethod
+    def _last_page(payload):
+        """Page count of a paginated list response (1 when unknown)"""
+        if not isinstance(payload, dict):
+            return 1
+        meta = payload.get("meta") or {}
+        return int(payload.get("last_page") or payload.get("lastPage") or meta.get("last_page") or 1)
+    
+    @staticmethod
+    def _has_next_page(payload):
+        if not isinstance(payload, dict):
+            return False
+        links = payload.get("links") if isinstance(payload.get("links"), dict) else {}
+        return bool(payload.get("next_page_url") or payload.get("nextPage") or links.get("next"))
+    
+    def _parse_scheduled_post(self, post):
+        """(post id, account ids, publish datetime in SocialBu's timezone) for a scheduled post, or None"""
+        publish_at = post.get("publish_at")
+        if not publish_at:
+            return None
+        try:
+            # Parse the schedule time (SocialBu returns local time in its timezone)
+            scheduled_dt = SOCIALBU_TZ.localize(datetime.strptime(publish_at, "%Y-%m-%d %H:%M:%S"))
+        except ValueError:
+            return None
+        post_id = post.get("id")
+        return (str(post_id) if post_id is not None else None), self._post_account_ids(post), scheduled_dt
+    
+    @staticmethod
+    def _post_account_ids(post):
+        """Account ids a scheduled post goes to (account_id, account or accounts field)"""
+        if post.get("account_id") is not None:
+            return [post["account_id"]]
+        
+        accounts = post.get("accounts") or ([post["account"]] if post.get("account") is not None else [])
+        account_ids = []
+        for account in accounts:
+            account_id = account.get("id") if isinstance(account, dict) else account
+            if account_id is not None:
+                account_ids.append(account_id)
+        return account_ids
+    
+    def sync_scheduled_posts(self, ledger_store):
+        """Merge the changes in SocialBu's scheduled posts since the last sync into the slot ledger"""
+        try:
+            posts, unchanged_post_ids, validators = self.fetch_scheduled_posts(ledger_store.get_sync_validators())
+        except Exception as e:
+            print(f"⚠️  Warning: Could not sync scheduled posts: {e}")
+            return False
+        
+        added, removed = ledger_store.merge_scheduled(posts, unchanged_post_ids)
+        ledger_store.mark_synced(validators)
+        print(f"   🔄 Synced scheduled SocialBu posts: {len(posts)} fetched, {len(unchanged_post_ids)} unchanged, "
+              f"{added} slots added, {removed} removed")
+        return True
 
     def _load_existing_schedules(self):
-        """Load existing scheduled posts to prevent conflicts"""
-        scheduled_times = self.get_scheduled_posts()
-        if scheduled_times:
-            print(f"   📅 Loaded {len(scheduled_times)} existing scheduled posts to prevent conflicts")
-            for scheduled_time in scheduled_times:
-                self.strategic_scheduler.mark_slot_as_used(scheduled_time)
+        """
+        Load existing scheduled posts into each account's slot ledger to prevent conflicts.
+        With a persistent ledger this is an indexed query; SocialBu is only synced for
+        scheduled post changes when the last sync is older than SLOT_LEDGER_SYNC_INTERVAL.
+        """
+        ledger_store = self.strategic_scheduler.ledger_store
+        if ledger_store:
+            try:
+                if ledger_store.needs_sync(SLOT_LEDGER_SYNC_INTERVAL):
+                    self.sync_scheduled_posts(ledger_store)
+                loaded = self.strategic_scheduler.load_reservations()
+                print(f"   📅 Loaded {loaded} slot reservations from the slot ledger")
+                return
+            except Exception as e:
+                print(f"⚠️  Warning: Slot ledger unavailable, keeping slots in memory: {e}")
+                self.strategic_scheduler.ledger_store = None
+        
+        scheduled_slots = self.get_scheduled_post_slots()
+        if scheduled_slots:
+            print(f"   📅 Loaded {len(scheduled_slots)} existing scheduled posts to prevent conflicts")
+            for account_ids, scheduled_time in scheduled_slots:
+                # Posts without a known account block the slot for every account
+                for account_id in account_ids or [None]:
+                    self.strategic_scheduler.mark_slot_as_used(scheduled_time, account=account_id)
 
 
 class ContentAnalyzer:
     """Service for analyzing and ranking posts"""
     
     @staticmethod
-    def get_top_posts(posts, count=3):
+    def engagement_score(post):
         """
-        Analyze posts and return top performers based on engagement
         Engagement score = (likes + comments * 3 + views * 0.1) / 1000
         """
-        if not posts:
-            return []
-        
-        # Calculate engagement score for each post
-        for post in posts:
-            likes = post.get("likes_count", 0)
-            comments = post.get("comments_count", 0)
-            views = post.get("views_count", 0)
-            
-            # Weight comments more heavily, views less
-            engagement_score = (likes + comments * 3 + views * 0.1) / 1000
-            post["engagement_score"] = engagement_score
+        likes = post.get("likes_count", 0)
+        comments = post.get("comments_count", 0)
+        views = post.get("views_count", 0)
         
-        # Sort by engagement score and return top posts
-        sorted_posts = sorted(posts, key=lambda x: x["engagement_score"], reverse=True)
-        return sorted_posts[:count] 
\ No newline at end of file
+        # Weight comments more heavily, views less
+        return (likes + comments * 3 + views * 0.1) / 1000
+    
+    @staticmethod
+    def push_top_post(heap, post, count, sequence):
+        """
+        Add a post to a bounded min-heap holding the best `count` posts seen so far.
+        Ties keep the earlier post.
+        """
+        post["engagement_score"] = ContentAnalyzer.engagement_score(post)
+        entry = (post["engagement_score"], -sequence, post)
+        if len(heap) < count:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+    
+    @staticmethod
+    def sorted_top_posts(heap):
+        """Return the posts of a bounded heap ordered best first"""
+        return [post for _, _, post in sorted(heap, key=lambda entry: entry[:2], reverse=True)]
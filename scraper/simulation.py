@@ -0,0 +1,198 @@
+"""
+Fast-forward simulation of the scheduling workflow: run_workflow cycles against fake
+Apify and SocialBu services on a VirtualClock, so months of scheduling take seconds
+"""
+
+import contextlib
+import hashlib
+import io
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+import pytz
+
+from .clock import VirtualClock
+from .config import PAGES
+from .dedup import BucketedProcessedPostStore
+from .results_log import ResultsLog
+from .services import SOCIALBU_TZ, SocialBuService, StrategicScheduler
+from .workflow import BeampageWorkflow
+
+
+def _stable_int(*parts):
+    """Deterministic 64-bit integer for a tuple of values"""
+    return int.from_bytes(hashlib.blake2b(":".join(map(str, parts)).encode(), digest_size=8).digest(), 'little')
+
+
+class FakeApifyService:
+    """
+    Apify stand-in: each competitor publishes a video post every 24 / posts_per_day
+    hours (at a fixed per-competitor offset), visible once the clock has passed it
+    """
+
+    def __init__(self, clock, posts_per_day=2, seed=0):
+        self.clock = clock
+        self.interval = 86400 / posts_per_day
+        self.seed = seed
+        self.runs = 0
+
+    def iter_instagram_posts(self, usernames, max_posts=10, newer_than=None):
+        """Yield up to max_posts of each competitor's newest posts, newest first"""
+        self.runs += 1
+        now = self.clock.time()
+        oldest = newer_than.timestamp() if newer_than else None
+        for username in usernames:
+            offset = _stable_int(self.seed, username) % int(self.interval)
+            newest = int((now - offset) // self.interval)
+            for sequence in range(newest, newest - max_posts, -1):
+                timestamp = sequence * self.interval + offset
+                if oldest is not None and timestamp <= oldest:
+                    break
+                yield self._post(username, sequence, timestamp)
+
+    def scrape_instagram_posts(self, usernames, max_posts=10, newer_than=None):
+        processed_results = {}
+        for post in self.iter_instagram_posts(usernames, max_posts, newer_than):
+            processed_results.setdefault(post["owner_username"], []).append(post)
+        return processed_results
+
+    def _post(self, username, sequence, timestamp):
+        post_id = f"{username}-{sequence}"
+        engagement = _stable_int(self.seed, post_id)
+        return {
+            "id": post_id,
+            "url": f"https://www.instagram.com/p/{post_id}/",
+            "video_url": f"https://cdn.example.com/{post_id}.mp4",
+            "caption": "",
+            "likes_count": engagement % 5000,
+            "comments_count": engagement // 5000 % 200,
+            "views_count": engagement // 1000000 % 100000,
+            "timestamp": datetime.fromtimestamp(timestamp, pytz.utc).isoformat(),
+            "owner_username": username,
+            "type": "Video",
+            "short_code": post_id,
+            "display_url": f"https://cdn.example.com/{post_id}.jpg"
+        }
+
+
+class FakeSocialBuService(SocialBuService):
+    """
+    SocialBu stand-in: the real scheduling code paths with the HTTP calls replaced.
+    Accepted posts are kept in `scheduled` as (account ids, publish time, time scheduled).
+    """
+
+    def __init__(self, clock, pages=None, failure_rate=0.0, seed=0):
+        self.random = random.Random(seed)
+        self.failure_rate = failure_rate
+        self.scheduled = []
+        self.uploads = 0
+        super().__init__(clock=clock, strategic_scheduler=StrategicScheduler(pages=pages, clock=clock), media_cache=False)
+
+    def _make_request(self, method, endpoint, **kwargs):
+        if method == "POST" and endpoint == "/posts":
+            if self.random.random() < self.failure_rate:
+                return {"success": False, "error": "Simulated SocialBu failure"}
+            data = kwargs["json"]
+            publish_at = SOCIALBU_TZ.localize(datetime.strptime(data["publish_at"], '%Y-%m-%d %H:%M:%S'))
+            self.scheduled.append((data["accounts"], publish_at, self.clock.now(pytz.utc)))
+            return {"success": True, "post_id": len(self.scheduled)}
+        return {"success": True, "data": []}
+
+    def get_scheduled_post_slots(self):
+        return []  # Nothing is scheduled when a simulation starts
+
+    def process_video_upload(self, video_url, max_retries=3, cache_key=None):
+        self.uploads += 1
+        return f"simulated-upload-{self.uploads}"
+
+
+class ScheduleSimulation:
+    """
+    Run run_workflow every cycle_hours of virtual time for `days` days, and report per
+    page and period: posts scheduled, slot utilization (posts publishing in the period
+    over the template slots in it), scheduling lag (publish time minus time scheduled),
+    how far ahead the ledger is booked, and the real cost of free-slot lookups.
+    """
+
+    def __init__(self, days=90, cycle_hours=1, posts_per_day=2, failure_rate=0.0, seed=0,
+                 start=None, pages=None, verbose=False):
+        self.days = days
+        self.cycle_hours = cycle_hours
+        self.posts_per_day = posts_per_day
+        self.failure_rate = failure_rate
+        self.seed = seed
+        self.start = start
+        self.pages = PAGES if pages is None else pages
+        self.verbose = verbose
+
+    def run(self, report_every_days=7):
+        """Run the simulation; returns a list of per-period reports"""
+        random.seed(self.seed)  # The workflow shuffles competitors and picks captions at random
+        with tempfile.TemporaryDirectory() as workdir:
+            clock = VirtualClock(self.start)
+            self.apify_service = FakeApifyService(clock, self.posts_per_day, self.seed)
+            self.socialbu_service = FakeSocialBuService(clock, self.pages, self.failure_rate, self.seed)
+            workflow = BeampageWorkflow(
+                apify_service=self.apify_service,
+                socialbu_service=self.socialbu_service,
+                processed_store=BucketedProcessedPostStore(os.path.join(workdir, "processed_posts")),
+                results_log=ResultsLog(os.path.join(workdir, "workflow_results.ndjson")),
+                clock=clock,
+                pages=self.pages,
+                watermarks_file=os.path.join(workdir, "scrape_watermarks.json")
+            )
+
+            reports = []
+            started = time.perf_counter()
+            period_start = self.started_at = clock.time()
+            end = period_start + self.days * 86400
+            while clock.time() < end:
+                period_end = min(period_start + report_every_days * 86400, end)
+                lookups = self.socialbu_service.strategic_scheduler.lookup_stats()
+                while clock.time() < period_end:
+                    with contextlib.ExitStack() as stack:
+                        if not self.verbose:
+                            stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+                        workflow.run_workflow()
+                    clock.advance(hours=self.cycle_hours)
+                reports.append(self._report(period_start, clock.time(), lookups))
+                period_start = clock.time()
+
+            self.elapsed_seconds = round(time.perf_counter() - started, 2)
+            return reports
+
+    def _report(self, period_start, period_end, lookups_before):
+        """Metrics for one period of virtual time"""
+        scheduler = self.socialbu_service.strategic_scheduler
+        lookups = scheduler.lookup_stats()
+        lookup_count = lookups["lookups"] - lookups_before["lookups"]
+        lookup_seconds = lookups["seconds"] - lookups_before["seconds"]
+        period_days = (period_end - period_start) / 86400
+
+        pages = {}
+        for page_name, page_config in self.pages.items():
+            account = page_config["socialbu_account_id"]
+            posts = [(publish_at.timestamp(), scheduled_at.timestamp())
+                     for accounts, publish_at, scheduled_at in self.socialbu_service.scheduled if account in accounts]
+            published = sum(1 for publish_at, _ in posts if period_start <= publish_at < period_end)
+            lags = [(publish_at - scheduled_at) / 3600 for publish_at, scheduled_at in posts
+                    if period_start <= scheduled_at < period_end]
+            horizon = scheduler.get_horizon(account=account)
+            today = scheduler.template(account).local_day(period_end)
+            pages[page_name] = {
+                "scheduled": len(lags),
+                "utilization": published / (len(scheduler.template(account).times) * period_days),
+                "mean_lag_hours": sum(lags) / len(lags) if lags else 0.0,
+                "max_lag_hours": max(lags) if lags else 0.0,
+                "horizon_days": (horizon["last_booked_day"] - today).days if horizon["last_booked_day"] else 0,
+                "booked_slots": horizon["booked_slots"]
+            }
+
+        return {
+            "day": round((period_end - self.started_at) / 86400),
+            "pages": pages,
+            "lookups": lookup_count,
+            "lookup_us": lookup_seconds / lookup_count * 1e6 if lookup_count else 0.0
+        }
@@ -0,0 +1,398 @@
+"""
+Posting slot templates and the calendar index of used slots for the strategic
+scheduler, and the database ledger that shares reservations between processes
+"""
+
+import heapq
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta, time as dt_time
+import pytz
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .config import SLOT_LEDGER_BACKEND, SLOT_LEDGER_SYNC_INTERVAL
+from .models import LedgerSyncState, SlotReservation
+
+ONE_DAY = timedelta(days=1)
+
+
+class SlotTemplate:
+    """
+    A page's posting times of day in its own timezone. Slot datetimes are compiled
+    once per day into a table (local datetimes plus UTC timestamps), so lookups on
+    the hot path never localize or convert timezones.
+    """
+
+    def __init__(self, posting_hours, timezone_name, min_spacing_minutes=0):
+        self.timezone = pytz.timezone(timezone_name)
+        self.timezone_name = timezone_name
+        self.times = sorted({self._minute_of_day(value) for value in posting_hours})
+        self.min_spacing_minutes = min_spacing_minutes
+        if not self.times:
+            raise ValueError("A slot template needs at least one posting hour")
+        self._check_spacing()
+        self._time_set = set(self.times)
+        self._table = {}  # date -> (local slot datetimes, UTC slot timestamps)
+
+    @staticmethod
+    def _minute_of_day(value):
+        """Minute of the day for a posting hour given as 15 or '15:30'"""
+        if isinstance(value, str):
+            hour, _, minute = value.partition(":")
+            hour, minute = int(hour), int(minute or 0)
+        else:
+            hour, minute = int(value), 0
+        if not (0 <= hour < 24 and 0 <= minute < 60):
+            raise ValueError(f"Invalid posting hour: {value!r}")
+        return hour * 60 + minute
+
+    def _check_spacing(self):
+        """Reject templates whose times (including across midnight) are closer than min spacing"""
+        if len(self.times) < 2:
+            return
+        gaps = [later - earlier for earlier, later in zip(self.times, self.times[1:])]
+        gaps.append(self.times[0] + 24 * 60 - self.times[-1])
+        if min(gaps) < self.min_spacing_minutes:
+            raise ValueError(
+                f"Posting hours {self.labels()} are closer than {self.min_spacing_minutes} minutes"
+            )
+
+    def labels(self):
+        return [f"{time_of_day // 60}:{time_of_day % 60:02d}" for time_of_day in self.times]
+
+    def _day_table(self, day):
+        entry = self._table.get(day)
+        if entry is None:
+            local_slots = tuple(
+                self.timezone.normalize(self.timezone.localize(
+                    datetime.combine(day, dt_time(time_of_day // 60, time_of_day % 60))
+                ))
+                for time_of_day in self.times
+            )
+            entry = (local_slots, tuple(slot.timestamp() for slot in local_slots))
+            self._table[day] = entry
+        return entry
+
+    def slot_datetime(self, day, time_of_day):
+        """Local aware datetime of a slot"""
+        return self._day_table(day)[0][self.times.index(time_of_day)]
+
+    def passed_times(self, day, now_timestamp):
+        """Times of day whose slot on `day` is at or before now_timestamp"""
+        return [
+            time_of_day for time_of_day, timestamp in zip(self.times, self._day_table(day)[1])
+            if timestamp <= now_timestamp
+        ]
+
+    def slots_near(self, timestamp, gap):
+        """Yield template slots (day, time of day, timestamp) less than gap seconds from timestamp"""
+        day = self.local_day(timestamp - gap)
+        last_day = self.local_day(timestamp + gap)
+        while day <= last_day:
+            for time_of_day, slot_timestamp in zip(self.times, self._day_table(day)[1]):
+                if abs(slot_timestamp - timestamp) < gap:
+                    yield day, time_of_day, slot_timestamp
+            day += ONE_DAY
+
+    def timestamp(self, value):
+        """UTC timestamp of a datetime (naive values are taken as local to the template)"""
+        return (self.timezone.localize(value) if value.tzinfo is None else value).timestamp()
+
+    def local_day(self, timestamp):
+        """Local date in the template's timezone for a UTC timestamp"""
+        return datetime.fromtimestamp(timestamp, self.timezone).date()
+
+    def locate(self, value):
+        """(local date, time of day) of a datetime; time of day is None if it is not a template slot"""
+        local = self.timezone.localize(value) if value.tzinfo is None else value.astimezone(self.timezone)
+        time_of_day = local.hour * 60 + local.minute
+        if local.second or local.microsecond or time_of_day not in self._time_set:
+            return local.date(), None
+        return local.date(), time_of_day
+
+    def expire(self, before_day):
+        """Drop compiled days before before_day"""
+        for day in [day for day in self._table if day < before_day]:
+            del self._table[day]
+
+
+class ReservationIndex:
+    """
+    One account's reservation times as a sorted list of UTC timestamps, at any minute.
+    A conflict check bisects for a reservation less than min_gap seconds away: O(log n).
+    """
+
+    def __init__(self, min_gap_seconds=0):
+        self.min_gap = max(min_gap_seconds, 1)  # Identical times always conflict
+        self._timestamps = []
+
+    def __len__(self):
+        return len(self._timestamps)
+
+    def __iter__(self):
+        return iter(self._timestamps)
+
+    def __contains__(self, timestamp):
+        index = bisect_left(self._timestamps, timestamp)
+        return index < len(self._timestamps) and self._timestamps[index] == timestamp
+
+    def add(self, timestamp):
+        insort(self._timestamps, timestamp)
+
+    def remove(self, timestamp):
+        """Remove one reservation at timestamp; returns False if there was none"""
+        if timestamp not in self:
+            return False
+        del self._timestamps[bisect_left(self._timestamps, timestamp)]
+        return True
+
+    def conflicts(self, timestamp):
+        """Whether a reservation lies less than min_gap seconds from timestamp"""
+        index = bisect_right(self._timestamps, timestamp - self.min_gap)
+        return index < len(self._timestamps) and self._timestamps[index] < timestamp + self.min_gap
+
+    def expire(self, before_timestamp):
+        """Drop reservations before a timestamp"""
+        del self._timestamps[:bisect_left(self._timestamps, before_timestamp)]
+
+
+class SlotCalendar:
+    """
+    Used posting slots stored as one bitmask per day over a template's times of day
+    (minutes since midnight). A "first free day" pointer skips the run of fully booked
+    days in front of it, so next-slot lookups are amortized O(1) however far ahead the
+    calendar is full. A min-heap of booked days lets past days be expired oldest first.
+    """
+
+    def __init__(self, times):
+        self.times = sorted(times)
+        self._bits = {time_of_day: 1 << index for index, time_of_day in enumerate(self.times)}
+        self.full_mask = (1 << len(self.times)) - 1
+        self._days = {}  # date -> bitmask of used times (days without bookings are absent)
+        self._day_heap = []  # booked dates, oldest first (may hold stale entries)
+        self._origin = None  # days before this have been expired
+        self._first_free_day = None  # every day in [_origin, _first_free_day) is fully booked
+
+    def __len__(self):
+        return sum(mask.bit_count() for mask in self._days.values())
+
+    def time_mask(self, times):
+        """Bitmask for the calendar's times among `times` (others are ignored)"""
+        mask = 0
+        for time_of_day in times:
+            mask |= self._bits.get(time_of_day, 0)
+        return mask
+
+    def reserve(self, day, time_of_day):
+        """Mark a slot as used; returns False if it was already taken or is not a calendar time"""
+        bit = self._bits.get(time_of_day)
+        mask = self._days.get(day, 0)
+        if bit is None or mask & bit:
+            return False
+
+        if not mask:
+            heapq.heappush(self._day_heap, day)
+        self._days[day] = mask | bit
+
+        if self._days[day] == self.full_mask and day == self._first_free_day:
+            self.first_free_day(day)
+        return True
+
+    def release(self, day, time_of_day):
+        """Free a used slot; returns False if it was not used"""
+        bit = self._bits.get(time_of_day)
+        mask = self._days.get(day, 0)
+        if bit is None or not mask & bit:
+            return False
+
+        if mask == bit:
+            del self._days[day]
+        else:
+            self._days[day] = mask & ~bit
+
+        if self._first_free_day is not None and self._origin <= day < self._first_free_day:
+            self._first_free_day = day
+        return True
+
+    def first_free_day(self, from_day):
+        """First day on or after from_day with at least one free slot"""
+        day = from_day
+        in_pointer_run = (
+            self._first_free_day is not None and self._origin <= from_day <= self._first_free_day
+        )
+        if in_pointer_run:
+            day = self._first_free_day
+
+        while self._days.get(day, 0) == self.full_mask:
+            day += ONE_DAY
+
+        if in_pointer_run:
+            self._first_free_day = day
+        return day
+
+    def next_free_slot(self, from_day, skip_mask=0):
+        """
+        First free (day, time of day) on or after from_day.
+        skip_mask marks times on from_day itself that can no longer be used.
+        """
+        free = ~(self._days.get(from_day, 0) | skip_mask) & self.full_mask
+        day = from_day
+        if not free:
+            day = self.first_free_day(from_day + ONE_DAY)
+            free = ~self._days.get(day, 0) & self.full_mask
+
+        lowest_bit = free & -free
+        return day, self.times[lowest_bit.bit_length() - 1]
+
+    def free_slots(self, start_day, end_day):
+        """Yield free (day, time of day) slots from start_day through end_day"""
+        day = start_day
+        while day <= end_day:
+            mask = self._days.get(day, 0)
+            if mask != self.full_mask:
+                for index, time_of_day in enumerate(self.times):
+                    if not mask & (1 << index):
+                        yield day, time_of_day
+            day += ONE_DAY
+
+    def occupancy(self, start_day, end_day):
+        """Yield (day, number of used slots) from start_day through end_day"""
+        day = start_day
+        while day <= end_day:
+            yield day, self._days.get(day, 0).bit_count()
+            day += ONE_DAY
+
+    def booked_days(self):
+        """Number of days with at least one used slot"""
+        return len(self._days)
+
+    def last_booked_day(self):
+        """Latest day with a used slot, or None"""
+        return max(self._days) if self._days else None
+
+    def expire(self, before_day):
+        """Drop bookings for days before before_day; returns the number of days dropped"""
+        dropped = 0
+        while self._day_heap and self._day_heap[0] < before_day:
+            if self._days.pop(heapq.heappop(self._day_heap), None) is not None:
+                dropped += 1
+
+        if self._origin is None or before_day > self._origin:
+            self._origin = before_day
+            if self._first_free_day is None or self._first_free_day < before_day:
+                self._first_free_day = before_day
+        return dropped
+
+
+class DatabaseSlotLedger:
+    """
+    Slot reservations shared across processes through the SlotReservation table.
+    The unique (account_id, slot) constraint makes a reservation first-come-first-served,
+    so concurrent workers can never book the same slot of an account.
+    """
+
+    sync_name = "socialbu_scheduled_posts"
+
+    @staticmethod
+    def _account_value(account):
+        return "" if account is None else str(account)
+
+    def load(self, since):
+        """Yield (account id or None, slot) for every reservation at or after since"""
+        rows = SlotReservation.objects.filter(slot__gte=since).values_list('account_id', 'slot')
+        for account_id, slot in rows.iterator(chunk_size=2000):
+            yield (account_id or None), slot
+
+    def try_reserve(self, account, slot):
+        """Insert a reservation; returns False if another process already holds the slot"""
+        try:
+            with transaction.atomic():
+                SlotReservation.objects.create(account_id=self._account_value(account), slot=slot)
+            return True
+        except IntegrityError:
+            return False
+
+    def release(self, account, slot):
+        """Delete a reservation made by a workflow run"""
+        SlotReservation.objects.filter(
+            account_id=self._account_value(account), slot=slot, source=SlotReservation.SOURCE_RESERVED
+        ).delete()
+
+    def merge_scheduled(self, scheduled_posts, unchanged_post_ids=(), unlinked_max_age=SLOT_LEDGER_SYNC_INTERVAL):
+        """
+        Apply a sync of SocialBu's scheduled posts: scheduled_posts are (post id, account ids, slot)
+        from changed pages, unchanged_post_ids are still scheduled as already recorded.
+        Only posts that were added, moved or removed touch the table. Slots this app reserved
+        more than unlinked_max_age seconds ago that no SocialBu post occupies (the post was
+        deleted, or never created) are freed.
+        Returns: (slots added, slots removed)
+        """
+        recorded = {}
+        rows = SlotReservation.objects.exclude(socialbu_post_id="").values_list('socialbu_post_id', 'account_id', 'slot')
+        for post_id, account_id, slot in rows.iterator(chunk_size=2000):
+            recorded.setdefault(post_id, set()).add((account_id, slot))
+
+        fetched = {}
+        untracked = set()  # Posts without an id can only be added, never diffed
+        for post_id, account_ids, slot in scheduled_posts:
+            slots = {(self._account_value(account_id), slot) for account_id in account_ids or [None]}
+            if post_id:
+                fetched.setdefault(post_id, set()).update(slots)
+            else:
+                untracked.update(slots)
+
+        stale_ids = [
+            post_id for post_id, slots in recorded.items()
+            if post_id not in unchanged_post_ids and fetched.get(post_id) != slots
+        ]
+        removed = 0
+        for start in range(0, len(stale_ids), 500):
+            removed += SlotReservation.objects.filter(socialbu_post_id__in=stale_ids[start:start + 500]).delete()[0]
+
+        new_slots = [
+            (post_id, account_id, slot)
+            for post_id, slots in fetched.items() if recorded.get(post_id) != slots
+            for account_id, slot in slots
+        ] + [("", account_id, slot) for account_id, slot in untracked]
+        SlotReservation.objects.bulk_create([
+            SlotReservation(account_id=account_id, slot=slot, source=SlotReservation.SOURCE_SOCIALBU, socialbu_post_id=post_id)
+            for post_id, account_id, slot in new_slots
+        ], batch_size=500, ignore_conflicts=True)
+
+        # Link slots this app reserved itself to the SocialBu posts now occupying them
+        for post_id, account_id, slot in new_slots:
+            if post_id:
+                SlotReservation.objects.filter(account_id=account_id, slot=slot, socialbu_post_id="").update(
+                    socialbu_post_id=post_id
+                )
+
+        removed += SlotReservation.objects.filter(
+            source=SlotReservation.SOURCE_RESERVED, socialbu_post_id="",
+            created_at__lt=timezone.now() - timedelta(seconds=unlinked_max_age)
+        ).delete()[0]
+        return len(new_slots), removed
+
+    def expire(self, before):
+        """Delete reservations for slots before a time; returns the number deleted"""
+        return SlotReservation.objects.filter(slot__lt=before).delete()[0]
+
+    def needs_sync(self, max_age_seconds):
+        """Whether SocialBu's scheduled posts were last swept longer ago than max_age_seconds"""
+        state = LedgerSyncState.objects.filter(name=self.sync_name).first()
+        return state is None or (timezone.now() - state.synced_at).total_seconds() > max_age_seconds
+
+    def get_sync_validators(self):
+        """Per-page validators saved by the last sync"""
+        state = LedgerSyncState.objects.filter(name=self.sync_name).first()
+        return state.validators if state else {}
+
+    def mark_synced(self, validators=None):
+        LedgerSyncState.objects.update_or_create(
+            name=self.sync_name, defaults={"synced_at": timezone.now(), "validators": validators or {}}
+        )
+
+
+def get_slot_ledger(backend=SLOT_LEDGER_BACKEND):
+    """Build the configured persistent slot ledger, or None to keep slots in memory only"""
+    if backend == "database":
+        return DatabaseSlotLedger()
+    return None
@@ -1,3 +1,516 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 
-# Create your tests here.
+import pytz
+from django.test import SimpleTestCase, TestCase
+
+from .cache import SQLiteScrapeCache
+from .clock import VirtualClock
+from .dedup import (
+    BloomFilteredStore, BucketedProcessedPostStore, DatabaseProcessedPostStore, JsonProcessedPostStore,
+    MmapProcessedPostStore,
+)
+from .media import MediaCache
+from .models import ProcessedPost, SlotReservation
+from .results_log import ResultsLog
+from .services import StrategicScheduler
+from .simulation import FakeApifyService, FakeSocialBuService
+from .slots import DatabaseSlotLedger
+from .transport import HttpTransport, StreamedBody
+from .workflow import BeampageWorkflow
+
+PAGES = {
+    "page_a": {"socialbu_account_id": 1, "posting_hours": [9, 15, 21], "timezone": "America/Panama", "min_spacing_minutes": 120},
+    "page_b": {"socialbu_account_id": 2, "posting_hours": ["10:30", 18], "timezone": "Europe/Madrid", "min_spacing_minutes": 60},
+}
+
+
+class ContendedLedger:
+    """Ledger store stand-in where another process already holds every third slot"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.claims = set()
+        self.attempts = 0
+
+    def try_reserve(self, account, slot):
+        with self.lock:
+            self.attempts += 1
+            if self.attempts % 3 == 0 or (account, slot) in self.claims:
+                return False
+            self.claims.add((account, slot))
+            return True
+
+    def release(self, account, slot):
+        with self.lock:
+            self.claims.discard((account, slot))
+
+
+class StrategicSchedulerThreadingTests(SimpleTestCase):
+    THREADS = 16
+    CALLS_PER_THREAD = 40
+
+    def hammer(self, scheduler, call):
+        start = threading.Barrier(self.THREADS)
+
+        def worker(index):
+            start.wait()
+            return [call(index) for _ in range(self.CALLS_PER_THREAD)]
+
+        with ThreadPoolExecutor(max_workers=self.THREADS) as executor:
+            return [slot for slots in executor.map(worker, range(self.THREADS)) for slot in slots]
+
+    def assert_spaced(self, slots, minutes):
+        ordered = sorted(slots)
+        for earlier, later in zip(ordered, ordered[1:]):
+            self.assertGreaterEqual((later - earlier).total_seconds(), minutes * 60)
+
+    def test_next_available_slot_is_never_assigned_twice(self):
+        scheduler = StrategicScheduler(pages=PAGES)
+        slots = self.hammer(scheduler, lambda index: scheduler.get_next_available_slot(page="page_a"))
+
+        self.assertEqual(len(slots), self.THREADS * self.CALLS_PER_THREAD)
+        self.assertEqual(len(set(slots)), len(slots))
+        self.assert_spaced(slots, 120)
+
+    def test_batches_across_accounts_with_contended_store(self):
+        store = ContendedLedger()
+        scheduler = StrategicScheduler(ledger_store=store, pages=PAGES)
+        pages = ["page_a", "page_b"]
+        batches = self.hammer(scheduler, lambda index: (pages[index % 2], scheduler.reserve_slots(3, page=pages[index % 2])))
+
+        for page, minutes in (("page_a", 120), ("page_b", 60)):
+            slots = [slot for batch_page, batch in batches if batch_page == page for slot in batch]
+            self.assertEqual(len(slots), self.THREADS // 2 * self.CALLS_PER_THREAD * 3)
+            self.assertEqual(len(set(slots)), len(slots))
+            self.assert_spaced(slots, minutes)
+        self.assertEqual(len(store.claims), sum(len(batch) for _, batch in batches))
+
+    def test_released_slots_are_handed_out_again_once(self):
+        scheduler = StrategicScheduler(pages=PAGES)
+
+        def reserve_and_release(index):
+            slots = scheduler.reserve_slots(2, page="page_b")
+            scheduler.release_slots(slots[1:], page="page_b")
+            return slots[0]
+
+        kept = self.hammer(scheduler, reserve_and_release)
+
+        self.assertEqual(len(set(kept)), len(kept))
+        self.assertEqual(len(scheduler.get_scheduled_slots_info(page="page_b")), len(kept))
+
+    def test_schedule_info_peeks_without_reserving(self):
+        clock = VirtualClock(datetime(2026, 1, 5, 12, tzinfo=pytz.utc))
+        with contextlib.redirect_stdout(io.StringIO()):
+            socialbu = FakeSocialBuService(clock, PAGES)
+        socialbu.strategic_scheduler = StrategicScheduler(pages=PAGES, clock=clock)
+
+        first = socialbu.get_strategic_schedule_info(page="page_a")
+        second = socialbu.get_strategic_schedule_info(page="page_a")
+
+        self.assertEqual(first["next_available_slot"], second["next_available_slot"])
+        self.assertEqual(second["scheduled_slots"], [])
+        next_slot = socialbu.strategic_scheduler.get_next_available_slot(page="page_a")
+        self.assertEqual(next_slot.strftime('%Y-%m-%d %H:%M'), first["next_available_slot"])
+
+
+WORKFLOW_PAGES = {
+    name: dict(config, competitors=[f"{name}_rival_{index}" for index in range(3)], generic_caption=["Caption"],
+               max_posts_to_fetch=5, top_posts_count=2, max_total_posts_to_schedule=4)
+    for name, config in PAGES.items()
+}
+
+
+class FakeApifyServiceAsync:
+    """ApifyServiceAsync stand-in that streams FakeApifyService posts through the event loop"""
+
+    def __init__(self, service):
+        self.service = service
+
+    async def iter_instagram_posts(self, usernames, max_posts=10, newer_than=None):
+        for post in self.service.iter_instagram_posts(usernames, max_posts, newer_than):
+            await asyncio.sleep(0)
+            yield post
+
+
+class ConcurrentWorkflowTests(TestCase):
+    def test_concurrent_workflow_schedules_every_page_with_database_stores(self):
+        clock = VirtualClock(datetime(2026, 1, 5, 12, tzinfo=pytz.utc))
+        sync_apify = FakeApifyService(clock)
+        async_apify = FakeApifyService(clock)
+        socialbu = FakeSocialBuService(clock, WORKFLOW_PAGES)
+        socialbu.strategic_scheduler = StrategicScheduler(ledger_store=DatabaseSlotLedger(), pages=WORKFLOW_PAGES, clock=clock)
+
+        with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(io.StringIO()):
+            workflow = BeampageWorkflow(
+                apify_service=sync_apify,
+                apify_service_async=FakeApifyServiceAsync(async_apify),
+                socialbu_service=socialbu,
+                processed_store=DatabaseProcessedPostStore(),
+                results_log=ResultsLog(os.path.join(workdir, "workflow_results.ndjson")),
+                clock=clock,
+                pages=WORKFLOW_PAGES,
+                watermarks_file=os.path.join(workdir, "scrape_watermarks.json")
+            )
+            results = workflow.run_workflow_async()
+
+        self.assertEqual([result["errors"] for result in results], [[], []])
+        self.assertEqual(async_apify.runs, 2)
+        self.assertEqual(sync_apify.runs, 0)  # No page fell back to scraping synchronously
+        self.assertEqual(len(socialbu.scheduled), 8)
+        self.assertEqual(SlotReservation.objects.count(), 8)
+        self.assertEqual(ProcessedPost.objects.count(), 8)
+
+
+class BloomFilteredStoreTests(SimpleTestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.store_path = os.path.join(workdir.name, "processed_posts.json")
+        self.bloom_path = os.path.join(workdir.name, "processed_posts.bloom")
+
+    def open_filter(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return BloomFilteredStore(JsonProcessedPostStore(self.store_path), self.bloom_path, capacity=1000)
+
+    def test_saved_filter_includes_ids_written_by_another_process(self):
+        process_a = self.open_filter()
+        process_b = self.open_filter()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            process_b.mark_processed(["111", "222"])
+            process_a.mark_processed(["333"])
+
+        fresh = self.open_filter()
+        self.assertEqual(fresh.filter_new(["111", "222", "333", "444"]), {"444"})
+
+    def test_open_filter_sees_ids_written_by_another_process(self):
+        process_a = self.open_filter()
+        process_b = self.open_filter()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            process_b.mark_processed(["111"])
+            self.assertEqual(process_a.filter_new(["111", "444"]), {"444"})
+
+
+class MmapProcessedPostStoreTests(SimpleTestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.path = os.path.join(workdir.name, "processed.idx")
+
+    def open_store(self):
+        store = MmapProcessedPostStore(self.path, tail_size=4)
+        self.addCleanup(store.close)
+        return store
+
+    def test_compaction_keeps_ids_appended_by_another_process(self):
+        process_a = self.open_store()
+        process_b = self.open_store()
+
+        process_a.mark_processed(["1", "2"])
+        process_b.mark_processed(["3"])
+        process_a.compact()
+        process_b.mark_processed(["4", "5", "6", "7"])  # Fills B's tail and compacts again
+
+        self.assertEqual(self.open_store().filter_new([str(n) for n in range(1, 9)]), {"8"})
+        self.assertEqual(process_a.filter_new(["3", "7", "8"]), {"8"})
+
+    def test_lookups_match_across_index_and_tail(self):
+        store = self.open_store()
+        store.mark_processed(["DQpAbC", "123", "mock-1", "456", "789"])  # The fifth id triggers a compaction
+        store.mark_processed(["999"])
+
+        self.assertTrue(os.path.getsize(self.path) > 0)
+        self.assertEqual(len(store), 6)
+        self.assertEqual(store.filter_new(["DQpAbC", "123", "mock-1", "999", "new"]), {"new"})
+
+
+class BucketedProcessedPostStoreTests(SimpleTestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.root = workdir.name
+
+    def open_store(self):
+        store = BucketedProcessedPostStore(self.root, tail_size=4)
+        self.addCleanup(store.compact)
+        return store
+
+    def test_reopened_store_sees_every_bucket(self):
+        store = self.open_store()
+        store.mark_processed(["1", "2"], "page_a", datetime(2026, 1, 5, tzinfo=pytz.utc))
+        store.mark_processed(["3", "1"], "page_b", datetime(2026, 3, 2, tzinfo=pytz.utc))
+
+        reopened = self.open_store()
+        self.assertEqual(len(reopened), 3)
+        self.assertEqual(reopened.filter_new(["1", "2", "3", "4"]), {"4"})
+
+    def test_expire_deletes_only_buckets_past_each_page_retention(self):
+        store = self.open_store()
+        store.mark_processed(["old"], "page_a", datetime(2026, 1, 5, tzinfo=pytz.utc))
+        store.mark_processed(["recent"], "page_a", datetime(2026, 3, 2, tzinfo=pytz.utc))
+        store.mark_processed(["kept"], "page_b", datetime(2026, 1, 5, tzinfo=pytz.utc))
+
+        removed = store.expire({"page_a": 30}, default_retention_days=180, now=datetime(2026, 3, 9, tzinfo=pytz.utc))
+
+        self.assertEqual(removed, 1)
+        self.assertEqual(self.open_store().filter_new(["old", "recent", "kept"]), {"old"})
+        self.assertFalse([name for name in os.listdir(os.path.join(self.root, "page_a")) if name.startswith("2026-01-05")])
+
+
+class ScrapeCacheTests(SimpleTestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.cache = SQLiteScrapeCache(os.path.join(workdir.name, "scrape_cache.sqlite3"))
+
+    def test_entry_is_narrowed_to_newer_filters_only(self):
+        scraped_after = datetime(2026, 1, 1, tzinfo=pytz.utc)
+        posts = [
+            {"id": "1", "timestamp": "2026-01-02T00:00:00.000Z"},
+            {"id": "2", "timestamp": "2026-01-04T00:00:00.000Z"},
+            {"id": "3", "timestamp": "unknown"},
+        ]
+        self.cache.set("Rival", 10, posts, scraped_after)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            narrowed = self.cache.get("rival", 10, datetime(2026, 1, 3, tzinfo=pytz.utc))
+            self.assertEqual([post["id"] for post in narrowed], ["2", "3"])
+            self.assertEqual(len(self.cache.get("rival", 10, scraped_after)), 3)
+            self.assertIsNone(self.cache.get("rival", 10, datetime(2025, 12, 1, tzinfo=pytz.utc)))
+            self.assertIsNone(self.cache.get("rival", 10))  # An unfiltered scrape asks for older posts too
+            self.assertIsNone(self.cache.get("rival", 20, datetime(2026, 1, 3, tzinfo=pytz.utc)))
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 3))
+
+
+class ScrapeCacheWriterTests(SimpleTestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.cache = SQLiteScrapeCache(os.path.join(workdir.name, "scrape_cache.sqlite3"))
+
+    def get(self, username):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.cache.get(username, 3)
+
+    def post(self, owner, post_id):
+        return {"id": post_id, "owner_username": owner}
+
+    def test_writes_each_username_as_soon_as_the_next_one_starts(self):
+        writer = self.cache.writer(["Alpha", "beta"], 3)
+        writer.add(self.post("alpha", "1"))
+        writer.add(self.post("alpha", "2"))
+        self.assertIsNone(self.get("alpha"))
+
+        writer.add(self.post("BETA", "3"))
+        self.assertEqual([post["id"] for post in self.get("ALPHA")], ["1", "2"])
+        self.assertIsNone(self.get("beta"))
+
+        writer.finish()
+        self.assertEqual([post["id"] for post in self.get("beta")], ["3"])
+
+    def test_empty_feeds_are_cached_only_when_every_owner_was_requested(self):
+        writer = self.cache.writer(["alpha", "quiet"], 3)
+        writer.add(self.post("alpha", "1"))
+        writer.finish()
+        self.assertEqual(self.get("quiet"), [])
+
+        writer = self.cache.writer(["renamed", "quiet2"], 3)
+        writer.add(self.post("new_name", "2"))
+        writer.finish()
+        self.assertIsNone(self.get("renamed"))
+        self.assertIsNone(self.get("quiet2"))
+        self.assertIsNone(self.get("new_name"))
+
+    def test_interleaved_username_is_not_cached(self):
+        writer = self.cache.writer(["alpha", "beta"], 3)
+        writer.add(self.post("alpha", "1"))
+        writer.add(self.post("beta", "2"))
+        writer.add(self.post("alpha", "3"))
+        writer.finish()
+
+        self.assertIsNone(self.get("alpha"))
+        self.assertEqual([post["id"] for post in self.get("beta")], ["2"])
+
+
+class DatabaseSlotLedgerTests(TestCase):
+    def test_merge_frees_old_reservations_no_socialbu_post_occupies(self):
+        ledger = DatabaseSlotLedger()
+        slots = [datetime(2026, 2, day, 15, tzinfo=pytz.utc) for day in (1, 2, 3)]
+        for slot in slots:
+            self.assertTrue(ledger.try_reserve(1, slot))
+        SlotReservation.objects.filter(slot__in=slots[:2]).update(created_at=datetime(2026, 1, 1, tzinfo=pytz.utc))
+
+        added, removed = ledger.merge_scheduled([("post-1", [1], slots[0])])
+
+        self.assertEqual((added, removed), (1, 1))
+        self.assertEqual(
+            sorted(SlotReservation.objects.values_list('slot', 'socialbu_post_id')),
+            [(slots[0], "post-1"), (slots[2], "")]
+        )
+
+
+class WatermarkTests(SimpleTestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        clock = VirtualClock(datetime(2026, 1, 5, 12, tzinfo=pytz.utc))
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.workflow = BeampageWorkflow(
+                apify_service=FakeApifyService(clock),
+                apify_service_async=FakeApifyServiceAsync(FakeApifyService(clock)),
+                socialbu_service=FakeSocialBuService(clock, WORKFLOW_PAGES),
+                processed_store=JsonProcessedPostStore(os.path.join(workdir.name, "processed_posts.json")),
+                results_log=ResultsLog(os.path.join(workdir.name, "workflow_results.ndjson")),
+                clock=clock,
+                pages=WORKFLOW_PAGES,
+                watermarks_file=os.path.join(workdir.name, "scrape_watermarks.json")
+            )
+
+    def update(self, page_name, newest, usernames):
+        pool = self.workflow._new_candidate_pool(page_name, WORKFLOW_PAGES[page_name])
+        pool.newest = newest
+        self.workflow._update_watermarks(page_name, pool, usernames)
+
+    def test_watermarks_persist_per_page_and_only_move_forward(self):
+        early = datetime(2026, 1, 1, tzinfo=pytz.utc)
+        late = datetime(2026, 1, 3, tzinfo=pytz.utc)
+        self.update("page_a", {"rival": late, "other": early}, ["Rival", "other"])
+        self.update("page_a", {"rival": early, "other": late}, ["rival", "other"])
+        self.update("page_b", {"rival": early}, ["rival"])
+
+        self.assertEqual(self.workflow._load_watermarks("page_a"), {"rival": late, "other": late})
+        self.assertEqual(self.workflow._load_watermarks("page_b"), {"rival": early})
+        self.assertEqual(self.workflow._load_watermarks("unknown_page"), {})
+
+    def test_competitors_not_considered_keep_their_watermark(self):
+        early = datetime(2026, 1, 1, tzinfo=pytz.utc)
+        self.update("page_a", {"rival": early}, ["rival"])
+        self.update("page_a", {"rival": datetime(2026, 1, 3, tzinfo=pytz.utc)}, ["other"])
+
+        self.assertEqual(self.workflow._load_watermarks("page_a"), {"rival": early})
+
+
+class ResultsLogTests(SimpleTestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.path = os.path.join(workdir.name, "workflow_results.ndjson")
+
+    def fill(self, log, count):
+        for number in range(count):
+            log.append([{"run": number, "padding": "x" * 40}])
+
+    def test_rotation_keeps_the_newest_segments(self):
+        for compress in (True, False):
+            with self.subTest(compress=compress):
+                log = ResultsLog(f"{self.path}.{compress}", max_bytes=200, max_segments=2, compress=compress)
+                self.fill(log, 20)
+
+                segments = log._segments()
+                self.assertEqual(len(segments), 2)
+                self.assertEqual(all(segment.endswith(".gz") for segment in segments), compress)
+                self.assertEqual([record["run"] for record in log.tail(6)], [14, 15, 16, 17, 18, 19])
+
+    def test_tail_reads_across_blocks_and_skips_torn_lines(self):
+        log = ResultsLog(self.path, max_bytes=10 ** 9)
+        log.append([{"run": number, "padding": "x" * 500} for number in range(40)])
+        with open(self.path, 'a') as f:
+            f.write('{"run": "torn')
+
+        self.assertEqual([record["run"] for record in log.tail(3)], [37, 38, 39])
+        self.assertEqual(len(log.tail(100)), 40)
+        self.assertEqual(ResultsLog(os.path.join(os.path.dirname(self.path), "missing.ndjson")).tail(), [])
+
+
+class MediaCacheTests(SimpleTestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.cache = MediaCache(os.path.join(workdir.name, "media_cache"), max_bytes=2500)
+
+    def store(self, key, content):
+        writer = self.cache.writer(key)
+        writer.write(content)
+        return writer.commit()
+
+    def cached_bytes(self, key):
+        cached = self.cache.get(key)
+        if cached is None:
+            return None
+        media_file, size, _ = cached
+        with media_file:
+            return media_file.read()
+
+    def test_least_recently_used_video_is_evicted_with_its_keys(self):
+        first = self.store("a", b"a" * 1000)
+        second = self.store("b", b"b" * 1000)
+        self.store("b-again", b"b" * 1000)  # Same content, one object
+        os.utime(self.cache._object_path(first), (1000, 1000))
+        os.utime(self.cache._object_path(second), (2000, 2000))
+        self.assertEqual(self.cached_bytes("a"), b"a" * 1000)  # Reading refreshes "a"
+
+        self.store("c", b"c" * 1000)
+
+        self.assertIsNone(self.cached_bytes("b"))
+        self.assertIsNone(self.cached_bytes("b-again"))
+        self.assertEqual(self.cached_bytes("a"), b"a" * 1000)
+        self.assertEqual(self.cached_bytes("c"), b"c" * 1000)
+        self.assertEqual(sorted(os.listdir(self.cache.keys_dir)), sorted(
+            os.path.basename(self.cache._entry_path(key)) for key in ("a", "c")
+        ))
+
+    def test_stale_temp_files_are_swept(self):
+        writer = self.cache.writer("abandoned")
+        writer.write(b"partial")
+        writer.file.close()
+        os.utime(writer.temp_path, (1000, 1000))
+
+        self.assertEqual(self.cache.evict(), len(b"partial"))
+        self.assertFalse(os.path.exists(writer.temp_path))
+
+
+class StreamedBodyTests(SimpleTestCase):
+    def test_body_relays_exactly_its_length_in_chunks(self):
+        sink = io.BytesIO()
+        body = StreamedBody(io.BytesIO(b"0123456789trailing"), 10, 4, sink=sink)
+
+        self.assertEqual(len(body), 10)
+        self.assertEqual(list(body), [b"0123", b"4567", b"89"])
+        self.assertTrue(body.complete)
+        self.assertEqual(sink.getvalue(), b"0123456789")
+
+    def test_short_source_aborts_the_body(self):
+        body = StreamedBody(io.BytesIO(b"0123"), 10, 4)
+
+        with self.assertRaises(IOError):
+            list(body)
+        self.assertFalse(body.complete)
+
+
+class HttpTransportTests(SimpleTestCase):
+    def test_uploads_only_retry_connection_errors(self):
+        transport = HttpTransport(max_retries=3)
+        self.addCleanup(transport.close)
+
+        api_retry = transport.api.get_adapter("https://socialbu.com/").max_retries
+        upload_retry = transport.s3.get_adapter("https://bucket.s3.amazonaws.com/").max_retries
+        self.assertEqual(api_retry.total, 3)
+        self.assertIn(503, api_retry.status_forcelist)
+        self.assertEqual((upload_retry.connect, upload_retry.read, upload_retry.status), (3, 0, 0))
+
+    def test_each_thread_gets_its_own_sessions(self):
+        transport = HttpTransport()
+        self.addCleanup(transport.close)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            sessions = list(executor.map(lambda _: (transport.cdn, transport.cdn), range(2)))
+        self.assertTrue(all(first is second for first, second in sessions))
+        self.assertIsNot(transport.cdn, sessions[0][0])
@@ -0,0 +1,118 @@
+"""
+Connection-pooled HTTP sessions for the hosts SocialBuService talks to
+"""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .config import HTTP_POOL_MAXSIZE, HTTP_MAX_RETRIES, HTTP_RETRY_BACKOFF
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+CDN_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+
+def pooled_session(retry, pool_maxsize=HTTP_POOL_MAXSIZE, headers=None):
+    """requests Session whose connections are kept alive in pools of pool_maxsize per host"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+class HttpTransport:
+    """
+    Keep-alive sessions for each upstream. requests.Session is not thread-safe, so
+    every thread gets its own session (and connection pools) per upstream:
+    - api: the SocialBu API. Connection errors and 429/5xx answers to idempotent requests
+      are retried with exponential backoff (POSTs are only retried if they were never sent).
+    - cdn: video downloads from the Instagram CDN, retried like the API.
+    - s3: PUTs to SocialBu's signed upload URLs. Only connection errors are retried,
+      since a streamed request body cannot be replayed once it started sending.
+    """
+
+    def __init__(self, api_headers=None, pool_maxsize=HTTP_POOL_MAXSIZE,
+                 max_retries=HTTP_MAX_RETRIES, backoff_factor=HTTP_RETRY_BACKOFF):
+        retry = Retry(total=max_retries, backoff_factor=backoff_factor, status_forcelist=RETRY_STATUSES,
+                      raise_on_status=False, respect_retry_after_header=True)
+        connect_retry = Retry(total=max_retries, connect=max_retries, read=0, status=0, other=0,
+                              backoff_factor=backoff_factor, raise_on_status=False)
+
+        self._session_args = {
+            "api": (retry, pool_maxsize, api_headers),
+            "cdn": (retry, pool_maxsize, {"User-Agent": CDN_USER_AGENT}),
+            "s3": (connect_retry, pool_maxsize, None),
+        }
+        self._local = threading.local()
+        self._sessions = []
+        self._sessions_lock = threading.Lock()
+
+    def _session(self, name):
+        """The calling thread's session for one upstream, created on first use"""
+        session = getattr(self._local, name, None)
+        if session is None:
+            session = pooled_session(*self._session_args[name])
+            setattr(self._local, name, session)
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
+
+    @property
+    def api(self):
+        return self._session("api")
+
+    @property
+    def cdn(self):
+        return self._session("cdn")
+
+    @property
+    def s3(self):
+        return self._session("s3")
+
+    def close(self):
+        """Close every thread's sessions"""
+        with self._sessions_lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
+        self._local = threading.local()
+
+
+class StreamedBody:
+    """
+    Request body that relays an open response stream (e.g. a CDN download's raw
+    urllib3 response) in large chunks. It has a length, so requests sends a
+    Content-Length instead of chunked encoding, and no read(), so http.client
+    sends each chunk as it is rather than re-reading it in 8 KB blocks.
+    A source that ends short of the promised length raises IOError, which aborts the request.
+    Every chunk sent is also written to `sink` when one is given; `complete` tells
+    whether the whole body was read.
+    """
+
+    def __init__(self, source, length, chunk_size, sink=None):
+        self.source = source
+        self.length = length
+        self.chunk_size = chunk_size
+        self.sink = sink
+        self.complete = False
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        remaining = self.length
+        while remaining > 0:
+            chunk = self.source.read(min(self.chunk_size, remaining))
+            if not chunk:
+                raise IOError(f"Stream ended {remaining} bytes short of its {self.length} byte length")
+            remaining -= len(chunk)
+            if self.sink is not None:
+                self.sink.write(chunk)
+            yield chunk
+        self.complete = True
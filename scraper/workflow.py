@@ -2,49 +2,172 @@
 Main workflow orchestrator for the Instagram content scraping and reposting process
 """
 
+import asyncio
 import json
 import os
-from datetime import datetime
 import random
+import pytz
+from concurrent.futures import ThreadPoolExecutor
 from django.core.management.base import BaseCommand
-from .config import PAGES
-from .services import ApifyService, SocialBuService, ContentAnalyzer
+from .config import PAGES, APIFY_MAX_CONCURRENT_RUNS, MEDIA_MAX_WORKERS
+from .services import ApifyService, ApifyServiceAsync, SocialBuService, ContentAnalyzer, parse_post_timestamp
+from .cache import get_scrape_cache
+from .clock import SystemClock
+from .dedup import get_processed_post_store
+from .results_log import ResultsLog
+
+# Number of scraped posts buffered per bulk "which of these ids are new" lookup
+DEDUP_BATCH_SIZE = 200
+
+
+class CandidatePool:
+    """
+    Streaming watermark -> dedup -> media validation -> ranking stages for scraped posts.
+    Posts are pushed in one at a time and only each competitor's best
+    `top_posts_count` new posts with valid media are kept in memory.
+    Dedup runs as bulk lookups against the processed post store, one small
+    buffer of posts at a time.
+    """
+    
+    def __init__(self, workflow, top_posts_count, watermarks=None, scrape_username=None):
+        self.workflow = workflow
+        self.top_posts_count = top_posts_count
+        self.pending = []  # (username, post) waiting for the bulk dedup lookup
+        self.watermarks = watermarks or {}  # username -> newest post timestamp already seen
+        self.scrape_username = scrape_username  # Optional lazy per-competitor scraper
+        self.scraped_usernames = set()
+        self.counts = {}  # username -> posts seen at each stage
+        self.heaps = {}  # username -> bounded heap of best candidates
+        self.newest = {}  # username -> newest post timestamp seen in this run
+        self.sequence = 0
+    
+    def newer_than(self, usernames):
+        """
+        Newer-than filter for one actor run over these usernames: the oldest of their
+        watermarks, or None if any of them has never been scraped.
+        """
+        watermarks = [self.watermarks.get(username.lower()) for username in usernames]
+        if not watermarks or None in watermarks:
+            return None
+        return min(watermarks)
+    
+    def add(self, post):
+        """Push one normalized post through the watermark, dedup, validation and ranking stages"""
+        # Instagram usernames are case-insensitive; match queryUsername back loosely
+        username = (post.get('owner_username') or "").lower()
+        counts = self.counts.setdefault(username, {"scraped": 0, "new": 0, "valid_media": 0})
+        counts["scraped"] += 1
+        
+        timestamp = parse_post_timestamp(post.get('timestamp'))
+        if timestamp:
+            if username not in self.newest or timestamp > self.newest[username]:
+                self.newest[username] = timestamp
+            watermark = self.watermarks.get(username)
+            if watermark and timestamp <= watermark:
+                return
+        
+        self.pending.append((username, post))
+        if len(self.pending) >= DEDUP_BATCH_SIZE:
+            self.flush()
+    
+    def flush(self):
+        """Run buffered posts through one bulk dedup lookup, then validation and ranking"""
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, []
+        new_ids = self.workflow.processed_store.filter_new([post.get('id') for _, post in pending])
+        
+        for username, post in pending:
+            if post.get('id') not in new_ids:
+                continue
+            counts = self.counts[username]
+            counts["new"] += 1
+            
+            if not self.workflow._validate_post_media(post):
+                continue
+            counts["valid_media"] += 1
+            
+            self.sequence += 1
+            heap = self.heaps.setdefault(username, [])
+            ContentAnalyzer.push_top_post(heap, post, self.top_posts_count, self.sequence)
+    
+    def add_all(self, posts):
+        """Consume a stream of normalized posts"""
+        for post in posts:
+            self.add(post)
+        self.flush()
+        return self
+    
+    def get(self, username):
+        """Return (stage counts, ranked candidate posts) for one competitor"""
+        if self.scrape_username and username not in self.scraped_usernames:
+            self.scraped_usernames.add(username)
+            self.add_all(self.scrape_username(username, self.newer_than([username])))
+        self.flush()
+        
+        username = username.lower()
+        return self.counts.get(username), ContentAnalyzer.sorted_top_posts(self.heaps.get(username, []))
 
 
 class BeampageWorkflow:
-    """Main workflow orchestrator"""
+    """
+    Main workflow orchestrator
+    Services, stores and the clock default to the configured ones and can be
+    injected instead (e.g. fakes and a VirtualClock for simulations).
+    """
     
-    def __init__(self):
-        self.apify_service = ApifyService()
-        self.socialbu_service = SocialBuService()
+    def __init__(self, apify_service=None, apify_service_async=None, socialbu_service=None,
+                 processed_store=None, results_log=None, clock=None, pages=None, watermarks_file="scrape_watermarks.json"):
+        self.clock = clock or SystemClock()
+        self.pages = PAGES if pages is None else pages
+        self.scrape_cache = get_scrape_cache() if apify_service is None else None
+        self.apify_service = ApifyService(cache=self.scrape_cache) if apify_service is None else apify_service
+        self.apify_service_async = ApifyServiceAsync(cache=self.scrape_cache) if apify_service_async is None else apify_service_async
+        self.socialbu_service = SocialBuService(clock=self.clock) if socialbu_service is None else socialbu_service
         self.content_analyzer = ContentAnalyzer()
-        self.results_file = "workflow_results.json"
-        self.processed_posts_file = "processed_posts.json"
+        self.results_log = ResultsLog() if results_log is None else results_log
+        self.results_file = self.results_log.path
+        # Compared with None because an empty BucketedProcessedPostStore (which defines __len__) is falsy
+        self.processed_store = get_processed_post_store() if processed_store is None else processed_store
+        self.watermarks_file = watermarks_file
     
-    def _load_processed_posts(self):
-        """Load previously processed post IDs"""
+    def _load_watermarks(self, page_name):
+        """Load the newest post timestamp seen per competitor of a page"""
         try:
-            if os.path.exists(self.processed_posts_file):
-                with open(self.processed_posts_file, 'r') as f:
-                    return json.load(f)
+            if os.path.exists(self.watermarks_file):
+                with open(self.watermarks_file, 'r') as f:
+                    page_watermarks = json.load(f).get(page_name, {})
+                return {username: parse_post_timestamp(value) for username, value in page_watermarks.items()}
             return {}
         except Exception as e:
-            print(f"Warning: Could not load processed posts: {e}")
+            print(f"Warning: Could not load scrape watermarks: {e}")
             return {}
     
-    def _save_processed_posts(self, processed_posts):
-        """Save processed post IDs"""
+    def _update_watermarks(self, page_name, candidate_pool, usernames):
+        """Advance the watermarks of the competitors that were considered in this run"""
+        newest = {
+            username.lower(): candidate_pool.newest[username.lower()]
+            for username in usernames if username.lower() in candidate_pool.newest
+        }
+        if not newest:
+            return
+        
         try:
-            with open(self.processed_posts_file, 'w') as f:
-                json.dump(processed_posts, f, indent=2)
+            all_watermarks = {}
+            if os.path.exists(self.watermarks_file):
+                with open(self.watermarks_file, 'r') as f:
+                    all_watermarks = json.load(f)
+            
+            page_watermarks = all_watermarks.setdefault(page_name, {})
+            for username, timestamp in newest.items():
+                previous = parse_post_timestamp(page_watermarks.get(username))
+                if previous is None or timestamp > previous:
+                    page_watermarks[username] = timestamp.isoformat()
+            
+            with open(self.watermarks_file, 'w') as f:
+                json.dump(all_watermarks, f)
         except Exception as e:
-            print(f"Warning: Could not save processed posts: {e}")
-    
-    def _filter_duplicate_posts(self, posts):
-        """Filter out posts that have already been processed"""
-        processed_posts = self._load_processed_posts()
-        new_posts = [post for post in posts if post['id'] not in processed_posts]
-        return new_posts
+            print(f"Warning: Could not save scrape watermarks: {e}")
     
     def _validate_post_media(self, post):
         """
@@ -61,34 +184,35 @@ class BeampageWorkflow:
         # Reject everything else (images, posts without video)
         return False
     
-    def _filter_posts_with_valid_media(self, posts):
-        """Filter posts to only include those with valid media URLs"""
-        valid_posts = []
-        skipped_count = 0
-        
-        for post in posts:
-            if self._validate_post_media(post):
-                valid_posts.append(post)
-            else:
-                skipped_count += 1
-                print(f"      ⚠️  Skipping post {post.get('id', 'unknown')} - no valid media URLs")
-        
-        if skipped_count > 0:
-            print(f"      📝 Skipped {skipped_count} posts without valid media")
-            
-        return valid_posts
-    
-    def _mark_posts_as_processed(self, posts):
+    def _mark_posts_as_processed(self, posts, page_name=""):
         """Mark posts as processed"""
-        processed_posts = self._load_processed_posts()
-        timestamp = datetime.now().isoformat()
-        
-        for post in posts:
-            post_id = post.get('id')
-            if post_id:
-                processed_posts[post_id] = timestamp
-        
-        self._save_processed_posts(processed_posts)
+        self.processed_store.mark_processed(
+            [post.get('id') for post in posts if post.get('id')],
+            page_name=page_name,
+            timestamp=self.clock.now(pytz.utc)
+        )
+    
+    def _expire_processed_posts(self):
+        """Drop processed post buckets older than each page's dedup_retention_days"""
+        retention_days_by_page = {
+            page_name: page_config["dedup_retention_days"]
+            for page_name, page_config in self.pages.items() if "dedup_retention_days" in page_config
+        }
+        try:
+            removed = self.processed_store.expire(retention_days_by_page, now=self.clock.now(pytz.utc))
+            if removed:
+                print(f"🧹 Expired {removed} processed posts past their retention window")
+        except Exception as e:
+            print(f"⚠️  Warning: Could not expire processed posts: {e}")
+    
+    def _get_pages_to_process(self, page_name=None):
+        """Resolve the page configs to process, or None if the page is unknown"""
+        if page_name:
+            if page_name not in self.pages:
+                print(f"❌ Page '{page_name}' not found in configuration")
+                return None
+            return {page_name: self.pages[page_name]}
+        return self.pages
     
     def run_workflow(self, page_name=None):
         """
@@ -96,14 +220,11 @@ class BeampageWorkflow:
         """
         print("🚀 Starting Beampage workflow...")
         
-        if page_name:
-            if page_name not in PAGES:
-                print(f"❌ Page '{page_name}' not found in configuration")
-                return
-            pages_to_process = {page_name: PAGES[page_name]}
-        else:
-            pages_to_process = PAGES
+        pages_to_process = self._get_pages_to_process(page_name)
+        if pages_to_process is None:
+            return
         
+        self._expire_processed_posts()
         all_results = []
         
         for page_name, page_config in pages_to_process.items():
@@ -113,15 +234,109 @@ class BeampageWorkflow:
         
         # Save results
         self._save_results(all_results)
+        self._print_cache_stats()
+        
+        print(f"\n✅ Workflow completed! Results saved to {self.results_file}")
+        return all_results
+    
+    def run_workflow_async(self, page_name=None, max_concurrent_runs=None):
+        """
+        Run the workflow with every page's competitors scraped concurrently.
+        Only the Apify actor runs happen on the event loop, bounded by a semaphore.
+        Dedup, ranking and scheduling use the ORM, so they run page by page after
+        the loop has finished, exactly as in run_workflow.
+        """
+        print("🚀 Starting Beampage workflow (concurrent scraping)...")
+        
+        pages_to_process = self._get_pages_to_process(page_name)
+        if pages_to_process is None:
+            return
+        
+        self._expire_processed_posts()
+        max_concurrent_runs = max_concurrent_runs or APIFY_MAX_CONCURRENT_RUNS
+        print(f"   🔍 Scraping {len(pages_to_process)} pages with up to {max_concurrent_runs} concurrent Apify runs...")
+        pools = {page_name: self._new_candidate_pool(page_name, page_config) for page_name, page_config in pages_to_process.items()}
+        scrape_results = asyncio.run(self._scrape_pages_async(pages_to_process, pools, max_concurrent_runs))
+        
+        all_results = []
+        
+        for (page_name, page_config), posts in zip(pages_to_process.items(), scrape_results):
+            print(f"\n📄 Processing page: {page_name}")
+            candidate_pool = None
+            if isinstance(posts, Exception):
+                # Fall back to scraping inline for this page
+                print(f"   ⚠️  Concurrent scrape failed ({posts}), scraping synchronously")
+            else:
+                candidate_pool = pools[page_name].add_all(posts)
+                self._print_scrape_summary(candidate_pool, page_config['competitors'])
+            result = self._process_page(page_name, page_config, candidate_pool=candidate_pool)
+            all_results.append(result)
+        
+        # Save results
+        self._save_results(all_results)
+        self._print_cache_stats()
         
         print(f"\n✅ Workflow completed! Results saved to {self.results_file}")
         return all_results
     
-    def _process_page(self, page_name, page_config):
-        """Process a single page with total output limit control"""
+    def _print_cache_stats(self):
+        """Log scrape cache, media cache and dedup filter counters for this run"""
+        if self.scrape_cache:
+            stats = self.scrape_cache.stats()
+            print(f"\n💾 Scrape cache ({stats['backend']}): {stats['hits']} hits, {stats['misses']} misses ({stats['hit_ratio']:.0%} hit ratio)")
+        media_cache = getattr(self.socialbu_service, 'media_cache', None)
+        if media_cache:
+            stats = media_cache.stats()
+            print(f"🎞️  Media cache ({stats['backend']}): {stats['hits']} hits, {stats['misses']} misses ({stats['hit_ratio']:.0%} hit ratio), "
+                  f"{stats['bytes_saved'] / (1024*1024):.1f} MB not downloaded again, {stats['bytes_stored'] / (1024*1024):.1f} MB stored")
+        if hasattr(self.processed_store, 'stats'):
+            stats = self.processed_store.stats()
+            print(f"🌸 Dedup filter ({stats['backend']}): {stats['lookups']} lookups, {stats['exact_store_lookups']} sent to the exact store, "
+                  f"false positive rate {stats['observed_false_positive_rate']:.2%} observed / {stats['estimated_false_positive_rate']:.2%} estimated, "
+                  f"last rebuild {stats['last_rebuild_keys']} keys in {stats['last_rebuild_seconds']}s")
+    
+    async def _scrape_pages_async(self, pages_to_process, pools, max_concurrent_runs):
+        """
+        Scrape every page concurrently with the async Apify client.
+        Returns each page's scraped posts (or the exception its scrape raised), in page order.
+        """
+        semaphore = asyncio.Semaphore(max_concurrent_runs)
+        return await asyncio.gather(
+            *(self._scrape_page_async(page_config, pools[page_name], semaphore) for page_name, page_config in pages_to_process.items()),
+            return_exceptions=True
+        )
+    
+    async def _scrape_page_async(self, page_config, pool, semaphore):
+        """
+        Scrape all competitors of a page using the async Apify client.
+        Returns the scraped posts; they go through the pool's dedup lookups
+        only after the event loop has finished.
+        """
+        competitors = page_config['competitors']
+        max_posts = page_config['max_posts_to_fetch']
+        scraped_posts = []
+        
+        async def scrape(usernames):
+            async with semaphore:
+                posts = self.apify_service_async.iter_instagram_posts(usernames, max_posts, pool.newer_than(usernames))
+                async for post in posts:
+                    scraped_posts.append(post)
+        
+        if page_config.get('batch_scrape', True):
+            await scrape(competitors)
+        else:
+            await asyncio.gather(*(scrape([username]) for username in competitors))
+        
+        return scraped_posts
+    
+    def _process_page(self, page_name, page_config, candidate_pool=None):
+        """
+        Process a single page with total output limit control.
+        candidate_pool is an optional CandidatePool already filled by a concurrent scrape.
+        """
         result = {
             "page_name": page_name,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": self.clock.now().isoformat(),
             "scraped_accounts": {},
             "selected_posts": {},
             "scheduled_posts": [],
@@ -141,51 +356,16 @@ class BeampageWorkflow:
             print(f"   🔀 Randomized competitor order: {competitors}")
             
             # Step 2: Scrape posts from competitors until we hit the limit
-            print(f"   🔍 Scraping posts from competitors (stopping at {max_total_posts} posts)...")
+            if candidate_pool is not None:
+                print(f"   🔍 Using posts already scraped for {len(competitors)} competitors...")
+            elif page_config.get('batch_scrape', True):
+                print(f"   🔍 Scraping {len(competitors)} competitors in a single Apify run...")
+                candidate_pool = self._scrape_competitors_batched(page_name, page_config, competitors)
+            else:
+                print(f"   🔍 Scraping posts from competitors (stopping at {max_total_posts} posts)...")
+                candidate_pool = self._scrape_competitor_individually(page_name, page_config)
             
-            all_selected_posts = []
-            scraped_count = 0
-            
-            for username in competitors:
-                if len(all_selected_posts) >= max_total_posts:
-                    print(f"      ✅ Reached target of {max_total_posts} posts - stopping scraping")
-                    break
-                
-                print(f"      📥 Scraping {username}...")
-                
-                # Scrape posts for this competitor
-                user_posts = self.apify_service.scrape_instagram_posts(
-                    [username], 
-                    page_config['max_posts_to_fetch']
-                )
-                
-                if username in user_posts and user_posts[username]:
-                    posts = user_posts[username]
-                    result["scraped_accounts"][username] = posts
-                    scraped_count += len(posts)
-                    
-                    # Filter duplicates and validate media
-                    new_posts = self._filter_duplicate_posts(posts)
-                    valid_posts = self._filter_posts_with_valid_media(new_posts)
-                    
-                    if valid_posts:
-                        # Select top posts for this competitor
-                        remaining_slots = max_total_posts - len(all_selected_posts)
-                        posts_to_take = min(page_config['top_posts_count'], remaining_slots)
-                        
-                        top_posts = self.content_analyzer.get_top_posts(valid_posts, posts_to_take)
-                        
-                        if top_posts:
-                            result["selected_posts"][username] = top_posts
-                            all_selected_posts.extend(top_posts)
-                            print(f"         ✅ Selected {len(top_posts)} posts ({len(all_selected_posts)}/{max_total_posts} total)")
-                        else:
-                            print(f"         ❌ No valid posts found")
-                    else:
-                        print(f"         ❌ No posts with valid media")
-                else:
-                    print(f"         ❌ No posts found")
-                    result["scraped_accounts"][username] = []
+            all_selected_posts = self._select_posts(result, page_config, competitors, candidate_pool, max_total_posts)
             
             # Step 3: Show summary
             total_posts_to_schedule = len(all_selected_posts)
@@ -199,38 +379,23 @@ class BeampageWorkflow:
                 "total_competitors": len(competitors)
             }
             
-            # Step 4: Schedule all selected posts immediately
+            # Step 4: Reserve slots for the whole batch, then schedule all selected posts
             if all_selected_posts:
                 print(f"   🚀 Scheduling {total_posts_to_schedule} posts on SocialBu...")
-                
-                for username, posts in result["selected_posts"].items():
-                    for post in posts:
-                        scheduled_result = self._schedule_single_post(
-                            page_config, 
-                            post, 
-                            username
-                        )
-                        result["scheduled_posts"].append(scheduled_result)
-                        
-                        # Log the scheduled time if available
-                        if scheduled_result["schedule_result"].get("scheduled_time"):
-                            print(f"      ✅ Post scheduled: {scheduled_result['schedule_result']['scheduled_time']}")
+                self._schedule_selected_posts(result, page_config)
                 
                 # Step 5: Mark scheduled posts as processed
-                self._mark_posts_as_processed(all_selected_posts)
+                self._mark_posts_as_processed(all_selected_posts, page_name)
                 print(f"   📝 Marked {len(all_selected_posts)} posts as processed")
             else:
                 print(f"   ⚠️  No posts to schedule")
             
+            # Step 6: Advance watermarks of the competitors considered in this run
+            if page_config.get('incremental_scrape', True):
+                self._update_watermarks(page_name, candidate_pool, result["scraped_accounts"].keys())
+            
             # Get strategic scheduling info
-            schedule_info = self.socialbu_service.get_strategic_schedule_info()
-            # Convert date objects to strings for JSON serialization
-            if schedule_info.get('scheduled_slots'):
-                schedule_info['scheduled_slots'] = [
-                    (date.isoformat() if hasattr(date, 'isoformat') else str(date), hour) 
-                    for date, hour in schedule_info['scheduled_slots']
-                ]
-            result["strategic_schedule_info"] = schedule_info
+            result["strategic_schedule_info"] = self.socialbu_service.get_strategic_schedule_info(account=page_config['socialbu_account_id'])
             
             print(f"   ✅ Page processing completed:")
             print(f"      Target: {max_total_posts} posts")
@@ -245,8 +410,141 @@ class BeampageWorkflow:
         
         return result
     
-    def _schedule_single_post(self, page_config, post, original_username):
-        """Schedule a single post on SocialBu using strategic time slots"""
+    def _new_candidate_pool(self, page_name, page_config, scrape_username=None):
+        """Create the candidate pool for a page, seeded with its scrape watermarks"""
+        watermarks = self._load_watermarks(page_name) if page_config.get('incremental_scrape', True) else {}
+        return CandidatePool(self, page_config['top_posts_count'], watermarks, scrape_username)
+    
+    def _scrape_competitors_batched(self, page_name, page_config, competitors):
+        """
+        Scrape every competitor in a single Apify actor run, streaming the dataset
+        through the candidate pool. Returns the filled CandidatePool.
+        """
+        pool = self._new_candidate_pool(page_name, page_config)
+        pool.add_all(self.apify_service.iter_instagram_posts(
+            competitors, page_config['max_posts_to_fetch'], pool.newer_than(competitors)
+        ))
+        self._print_scrape_summary(pool, competitors)
+        return pool
+    
+    def _print_scrape_summary(self, pool, competitors):
+        """Log how many posts a streamed scrape produced"""
+        scraped_count = sum(counts["scraped"] for counts in pool.counts.values())
+        print(f"      ✅ Scraped {scraped_count} posts from {len(pool.counts)}/{len(competitors)} competitors")
+    
+    def _scrape_competitor_individually(self, page_name, page_config):
+        """Return a candidate pool that runs one Apify actor run per competitor on demand"""
+        def scrape_username(username, newer_than):
+            print(f"      📥 Scraping {username}...")
+            return self.apify_service.iter_instagram_posts([username], page_config['max_posts_to_fetch'], newer_than)
+        return self._new_candidate_pool(page_name, page_config, scrape_username)
+    
+    def _select_posts(self, result, page_config, competitors, candidate_pool, max_total_posts):
+        """
+        Walk competitors in order and select their top posts until the total limit is reached.
+        Returns the list of all selected posts.
+        """
+        all_selected_posts = []
+        
+        for username in competitors:
+            if len(all_selected_posts) >= max_total_posts:
+                print(f"      ✅ Reached target of {max_total_posts} posts - stopping")
+                break
+            
+            counts, candidates = candidate_pool.get(username)
+            
+            if counts:
+                result["scraped_accounts"][username] = counts
+                
+                if candidates:
+                    # Select top posts for this competitor
+                    remaining_slots = max_total_posts - len(all_selected_posts)
+                    posts_to_take = min(page_config['top_posts_count'], remaining_slots)
+                    
+                    top_posts = candidates[:posts_to_take]
+                    result["selected_posts"][username] = top_posts
+                    all_selected_posts.extend(top_posts)
+                    print(f"         ✅ {username}: selected {len(top_posts)} posts ({len(all_selected_posts)}/{max_total_posts} total)")
+                elif counts["new"] == 0:
+                    print(f"         ❌ {username}: no new posts")
+                else:
+                    print(f"         ❌ {username}: no posts with valid media (skipped {counts['new']})")
+            else:
+                print(f"         ❌ {username}: no posts found")
+                result["scraped_accounts"][username] = {"scraped": 0, "new": 0, "valid_media": 0}
+        
+        return all_selected_posts
+    
+    def _schedule_selected_posts(self, result, page_config):
+        """
+        Reserve one strategic slot per selected post up front, process every post's media
+        concurrently (download, upload and SocialBu's processing wait), then schedule the
+        posts in order. Slots of posts that fail to schedule are released for later runs.
+        """
+        scheduler = self.socialbu_service.strategic_scheduler
+        account_id = page_config['socialbu_account_id']
+        planned_posts = [
+            (username, post)
+            for username, posts in result["selected_posts"].items()
+            for post in posts
+        ]
+        slots = scheduler.reserve_slots(len(planned_posts), account=account_id)
+        print(f"   📅 Reserved {len(slots)} slots: {slots[0].strftime('%Y-%m-%d %H:%M')} to {slots[-1].strftime('%Y-%m-%d %H:%M')}")
+        
+        attempted = 0
+        try:
+            upload_tokens = self._process_media([post for _, post in planned_posts])
+            for (username, post), slot, upload_token in zip(planned_posts, slots, upload_tokens):
+                attempted += 1
+                scheduled_result = self._schedule_single_post(page_config, post, username, slot=slot, upload_token=upload_token)
+                result["scheduled_posts"].append(scheduled_result)
+                
+                # Log the scheduled time if available
+                if scheduled_result["schedule_result"].get("scheduled_time"):
+                    print(f"      ✅ Post scheduled: {scheduled_result['schedule_result']['scheduled_time']}")
+                elif not scheduled_result["schedule_result"].get("success"):
+                    scheduler.release_slots([slot], account=account_id)
+                    print(f"      ↩️  Released slot {slot.strftime('%Y-%m-%d %H:%M')}")
+        finally:
+            # Hand back slots that were never used (e.g. after an unexpected error)
+            scheduler.release_slots(slots[attempted:], account=account_id)
+    
+    def _process_media(self, posts):
+        """
+        Upload the media of posts to SocialBu in a bounded worker pool
+        Returns: upload token (None if processing failed or there is no media) per post, in order
+        """
+        def upload(post):
+            media_url = self._media_url(post)
+            if not media_url:
+                return None
+            try:
+                return self.socialbu_service.process_video_upload(
+                    media_url, cache_key=post.get('short_code') or post.get('id')
+                )
+            except Exception as e:
+                print(f"      ❌ Media processing error for post {post.get('id', 'unknown')}: {e}")
+                return None
+        
+        if not posts:
+            return []
+        max_workers = min(MEDIA_MAX_WORKERS, len(posts))
+        print(f"   🎬 Processing media for {len(posts)} posts with up to {max_workers} workers...")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(upload, posts))
+    
+    @staticmethod
+    def _media_url(post):
+        """Video URL of a post, or its display URL (image) when it has no video"""
+        video_url = post.get('video_url')
+        return video_url if (video_url and video_url != "") else post.get('display_url')
+    
+    def _schedule_single_post(self, page_config, post, original_username, slot=None, upload_token=None):
+        """
+        Schedule a single post on SocialBu using strategic time slots.
+        With a reserved slot the media must already be processed (upload_token);
+        a post with media but no token is skipped, so the caller can release the slot.
+        """
         # Create caption with original poster credit
         caption = f"{random.choice(page_config['generic_caption'])}\n\nOriginal by: @{original_username}"
         
@@ -255,7 +553,7 @@ class BeampageWorkflow:
         display_url = post.get('display_url')
         
         # Use video URL if available, otherwise use display URL (image)
-        media_url = video_url if (video_url and video_url != "") else display_url
+        media_url = self._media_url(post)
         
         # Prepare Instagram-specific options based on media type
         media_options = {}
@@ -272,13 +570,18 @@ class BeampageWorkflow:
                 "comment": f"Original content by @{original_username}"
             }
         
-        # Schedule the post using strategic scheduling with media handling
-        schedule_result = self.socialbu_service.schedule_post_with_strategic_timing(
-            content=caption,
-            accounts=[page_config['socialbu_account_id']],
-            video_url=media_url,  # SocialBu uses 'video_url' param for both videos and images
-            media_options=media_options if media_options else None
-        )
+        if slot and media_url and not upload_token:
+            schedule_result = {"success": False, "error": "Media processing failed"}
+        else:
+            # Schedule the post using strategic scheduling with media handling
+            schedule_result = self.socialbu_service.schedule_post_with_strategic_timing(
+                content=caption,
+                accounts=[page_config['socialbu_account_id']],
+                video_url=media_url,  # SocialBu uses 'video_url' param for both videos and images
+                media_options=media_options if media_options else None,
+                slot=slot,
+                upload_token=upload_token
+            )
         
         return {
             "original_post_id": post['id'],
@@ -290,54 +593,88 @@ class BeampageWorkflow:
             "caption": caption,
             "engagement_score": post.get('engagement_score', 0),
             "schedule_result": schedule_result,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": self.clock.now().isoformat()
+        }
+    
+    def _compact_result(self, result):
+        """
+        Reduce a page result to what the results log needs: post ids instead of
+        full scraped posts, and just the outcome of each scheduling call
+        """
+        schedule_info = result.get("strategic_schedule_info", {})
+        return {
+            "page_name": result["page_name"],
+            "timestamp": result["timestamp"],
+            "scraped_accounts": result["scraped_accounts"],
+            "selected_posts": {
+                username: [post.get('id') for post in posts]
+                for username, posts in result["selected_posts"].items()
+            },
+            "scheduled_posts": [
+                {
+                    "original_post_id": scheduled["original_post_id"],
+                    "original_username": scheduled["original_username"],
+                    "media_type": scheduled["media_type"],
+                    "engagement_score": scheduled["engagement_score"],
+                    "success": scheduled["schedule_result"].get("success", False),
+                    "scheduled_time": scheduled["schedule_result"].get("scheduled_time"),
+                    "error": scheduled["schedule_result"].get("error")
+                }
+                for scheduled in result["scheduled_posts"]
+            ],
+            "strategic_schedule_info": {
+                "next_available_slot": schedule_info.get("next_available_slot"),
+                "scheduled_slots_count": len(schedule_info.get("scheduled_slots", []))
+            },
+            "total_limit_info": result["total_limit_info"],
+            "errors": result["errors"]
         }
     
     def _save_results(self, results):
-        """Save workflow results to JSON file"""
+        """Append workflow results to the results log"""
         try:
-            # Load existing results if file exists
-            if os.path.exists(self.results_file):
-                with open(self.results_file, 'r') as f:
-                    existing_results = json.load(f)
-            else:
-                existing_results = []
-            
-            # Append new results
-            existing_results.extend(results)
-            
-            # Keep only last 100 results for cleanup
-            if len(existing_results) > 100:
-                existing_results = existing_results[-100:]
-                print(f"   🧹 Cleaned up old workflow results, keeping last 100 entries")
-            
-            # Save updated results
-            with open(self.results_file, 'w') as f:
-                json.dump(existing_results, f, indent=2)
-                
+            self.results_log.append(self._compact_result(result) for result in results)
         except Exception as e:
             print(f"Warning: Could not save results to file: {e}")
     
     def get_recent_results(self, limit=10):
         """Get recent workflow results"""
         try:
-            if os.path.exists(self.results_file):
-                with open(self.results_file, 'r') as f:
-                    results = json.load(f)
-                    return results[-limit:] if len(results) > limit else results
-            return []
+            return self.results_log.tail(limit)
         except Exception as e:
             print(f"Error reading results file: {e}")
             return []
     
-    def get_strategic_schedule_status(self):
-        """Get current strategic scheduling status"""
-        return self.socialbu_service.get_strategic_schedule_info()
+    def get_strategic_schedule_status(self, account=None):
+        """Get current strategic scheduling status (read-only, no slot is reserved)"""
+        return self.socialbu_service.get_strategic_schedule_info(account=account)
+    
+    def print_strategic_schedule_status(self, max_slots_shown=None):
+        """Print each page's strategic scheduling status from its account's slot ledger"""
+        for page_name, config in self.pages.items():
+            schedule_info = self.get_strategic_schedule_status(account=config['socialbu_account_id'])
+            horizon = schedule_info['horizon']
+            print(f"   {page_name} (SocialBu account {config['socialbu_account_id']}):")
+            print(f"     Strategic posting times: {', '.join(schedule_info['strategic_times'])} ({schedule_info['timezone']})")
+            print(f"     Next available slot: {schedule_info['next_available_slot']}")
+            print(f"     Booked through: {horizon['last_booked_day'] or 'nothing booked'} "
+                  f"({horizon['booked_slots']} slots on {horizon['booked_days']} days)")
+            total = len(schedule_info['strategic_times'])
+            print(f"     Next {len(schedule_info['occupancy'])} days: " +
+                  ", ".join(f"{day[5:]} {used}/{total}" for day, used in schedule_info['occupancy']))
+            if max_slots_shown == 0:
+                continue
+            if schedule_info['scheduled_slots']:
+                print(f"     Currently scheduled slots: {len(schedule_info['scheduled_slots'])}")
+                for date, slot_time in schedule_info['scheduled_slots'][-max_slots_shown if max_slots_shown else 0:]:
+                    print(f"       - {date} at {slot_time}")
+            else:
+                print("     No slots currently scheduled")
     
     def list_configured_pages(self):
         """List all configured pages"""
         print("📋 Configured pages:")
-        for page_name, config in PAGES.items():
+        for page_name, config in self.pages.items():
             print(f"   - {page_name}")
             print(f"     IG Account: {config['ig_account_name']}")
             print(f"     Competitors: {', '.join(config['competitors'])}")
@@ -347,19 +684,11 @@ class BeampageWorkflow:
             print()
         
         # Show strategic scheduling info
-        schedule_info = self.get_strategic_schedule_status()
         print("⏰ Strategic Scheduling Information:")
-        print(f"   Strategic posting times: {', '.join(schedule_info['strategic_times'])}")
-        print(f"   Next available slot: {schedule_info['next_available_slot']}")
-        if schedule_info['scheduled_slots']:
-            print(f"   Currently scheduled slots: {len(schedule_info['scheduled_slots'])}")
-            for date, hour in schedule_info['scheduled_slots'][-5:]:  # Show last 5
-                print(f"     - {date} at {hour}:00")
-        else:
-            print("   No slots currently scheduled")
+        self.print_strategic_schedule_status(max_slots_shown=5)  # Show last 5
 
 
-def run_workflow_command(page_name=None):
+def run_workflow_command(page_name=None, concurrent=False, max_concurrent_runs=None):
     """Command line entry point for running the workflow"""
     workflow = BeampageWorkflow()
     
@@ -391,23 +720,16 @@ def run_workflow_command(page_name=None):
         
         # Show current scheduling status
         print("\n⏰ Current Strategic Scheduling Status:")
-        schedule_info = workflow.get_strategic_schedule_status()
-        print(f"   Strategic posting times: {', '.join(schedule_info['strategic_times'])}")
-        print(f"   Next available slot: {schedule_info['next_available_slot']}")
+        workflow.print_strategic_schedule_status(max_slots_shown=0)
         return
     
     if page_name == "schedule":
         print("⏰ Strategic Scheduling Information:")
-        schedule_info = workflow.get_strategic_schedule_status()
-        print(f"   Strategic posting times: {', '.join(schedule_info['strategic_times'])}")
-        print(f"   Next available slot: {schedule_info['next_available_slot']}")
-        if schedule_info['scheduled_slots']:
-            print(f"   Currently scheduled slots: {len(schedule_info['scheduled_slots'])}")
-            for date, hour in schedule_info['scheduled_slots']:
-                print(f"     - {date} at {hour}:00")
-        else:
-            print("   No slots currently scheduled")
+        workflow.print_strategic_schedule_status()
         return
     
     # Run the main workflow
-    workflow.run_workflow(page_name) 
\ No newline at end of file
+    if concurrent:
+        workflow.run_workflow_async(page_name, max_concurrent_runs)
+    else:
+        workflow.run_workflow(page_name) 
\ No newline at end of file